@@ -0,0 +1,83 @@
+import argparse
+import timeit
+
+from typing import Callable
+
+import numpy as np
+
+from faster_whisper.feature_extractor import FeatureExtractor
+
+parser = argparse.ArgumentParser(description="Feature extractor benchmark")
+parser.add_argument(
+    "--repeat",
+    type=int,
+    default=3,
+    help="Times an experiment will be run.",
+)
+parser.add_argument(
+    "--duration",
+    type=float,
+    default=30.0,
+    help="Duration in seconds of the synthetic audio.",
+)
+parser.add_argument(
+    "--batch_size",
+    type=int,
+    default=8,
+    help="Number of chunks for the batched extraction.",
+)
+args = parser.parse_args()
+
+feature_extractor = FeatureExtractor()
+
+
+def reference_features(waveform: np.ndarray, padding: int = 160) -> np.ndarray:
+    """Log-Mel spectrogram computed with the generic STFT implementation."""
+    waveform = np.pad(waveform.astype(np.float32), (0, padding))
+    window = np.hanning(feature_extractor.n_fft + 1)[:-1].astype("float32")
+    stft = feature_extractor.stft(
+        waveform,
+        feature_extractor.n_fft,
+        feature_extractor.hop_length,
+        window=window,
+        return_complex=True,
+    ).astype("complex64")
+    magnitudes = np.abs(stft[..., :-1]) ** 2
+    mel_spec = feature_extractor.mel_filters @ magnitudes
+    log_spec = np.log10(np.clip(mel_spec, a_min=1e-10, a_max=None))
+    log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+def measure_speed(name: str, func: Callable[[], None]):
+    # as written in https://docs.python.org/3/library/timeit.html#timeit.Timer.repeat,
+    # min should be taken rather than the average
+    runtimes = timeit.repeat(
+        func,
+        repeat=args.repeat,
+        number=10,
+    )
+    print("%s min execution time: %.2fms" % (name, min(runtimes) / 10.0 * 1000))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    num_samples = int(args.duration * feature_extractor.sampling_rate)
+    waveform = rng.uniform(-0.5, 0.5, num_samples).astype(np.float32)
+    waveforms = rng.uniform(-0.5, 0.5, (args.batch_size, num_samples)).astype(
+        np.float32
+    )
+
+    max_diff = np.abs(reference_features(waveform) - feature_extractor(waveform)).max()
+    print("Max absolute difference with the reference: %.3g" % max_diff)
+
+    measure_speed("Reference", lambda: reference_features(waveform))
+    measure_speed("FeatureExtractor", lambda: feature_extractor(waveform))
+    measure_speed(
+        "Reference (%d chunks)" % args.batch_size,
+        lambda: [reference_features(chunk) for chunk in waveforms],
+    )
+    measure_speed(
+        "FeatureExtractor.batch (%d chunks)" % args.batch_size,
+        lambda: feature_extractor.batch(waveforms),
+    )
@@ -0,0 +1,82 @@
+import argparse
+import os
+import timeit
+
+from typing import Callable
+
+import tokenizers
+
+from faster_whisper.tokenizer import Tokenizer
+
+parser = argparse.ArgumentParser(description="Tokenizer benchmark")
+parser.add_argument(
+    "--repeat",
+    type=int,
+    default=3,
+    help="Times an experiment will be run.",
+)
+parser.add_argument(
+    "--tokenizer",
+    type=str,
+    default="openai/whisper-tiny",
+    help="Path to a tokenizer.json file or name of a model on the Hugging Face Hub.",
+)
+parser.add_argument(
+    "--num_tokens",
+    type=int,
+    default=220,
+    help="Number of tokens of the segments, at most 224 in a Whisper window.",
+)
+args = parser.parse_args()
+
+TEXTS = {
+    "Latin": (
+        " And so, my fellow Americans, ask not what your country can do for you,"
+        " ask what you can do for your country. Élève à l'école, naïve façade."
+    ),
+    "CJK": "私たちは次のサービスエリアで休憩します。前方三公里处有加油站。다음 휴게소까지 얼마나 남았나요?",
+}
+
+
+def load_tokenizer() -> Tokenizer:
+    if os.path.isfile(args.tokenizer):
+        hf_tokenizer = tokenizers.Tokenizer.from_file(args.tokenizer)
+    else:
+        hf_tokenizer = tokenizers.Tokenizer.from_pretrained(args.tokenizer)
+    return Tokenizer(hf_tokenizer, False)
+
+
+def segment_tokens(tokenizer: Tokenizer, text: str) -> list:
+    tokens = tokenizer.encode(text)
+    tokens = (tokens * (args.num_tokens // len(tokens) + 1))[: args.num_tokens]
+    return tokens + [tokenizer.eot]
+
+
+def measure_speed(name: str, func: Callable[[], None]):
+    # as written in https://docs.python.org/3/library/timeit.html#timeit.Timer.repeat,
+    # min should be taken rather than the average
+    runtimes = timeit.repeat(
+        func,
+        repeat=args.repeat,
+        number=10,
+    )
+    print("%s min execution time: %.2fms" % (name, min(runtimes) / 10.0 * 1000))
+
+
+if __name__ == "__main__":
+    tokenizer = load_tokenizer()
+
+    for script, text in TEXTS.items():
+        tokens = segment_tokens(tokenizer, text)
+        assert tokenizer.split_tokens_on_unicode(
+            tokens
+        ) == tokenizer._split_tokens_on_unicode_by_decoding(tokens)
+
+        measure_speed(
+            "Decoding prefixes (%s, %d tokens)" % (script, len(tokens)),
+            lambda: tokenizer._split_tokens_on_unicode_by_decoding(tokens),
+        )
+        measure_speed(
+            "Token bytes (%s, %d tokens)" % (script, len(tokens)),
+            lambda: tokenizer.split_tokens_on_unicode(tokens),
+        )
@@ -0,0 +1,189 @@
+import queue
+import threading
+import time
+
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import List, Union
+
+import ctranslate2
+import numpy as np
+
+
+@dataclass
+class _AlignmentRequest:
+    features: ctranslate2.StorageView
+    start_sequence: List[int]
+    text_tokens: List[List[int]]
+    num_frames: List[int]
+    median_filter_width: int
+    future: Future
+
+
+class AlignmentScheduler:
+    """Groups the alignment requests of concurrent transcriptions into batched calls.
+
+    The scheduler exposes the same `align` method as `ctranslate2.models.Whisper`. Requests
+    submitted from several threads (e.g. one per transcription or streaming session) within
+    `max_wait_time` seconds are aligned with a single call to the model, and the results are
+    distributed back to the callers. Requests are only batched together when they share the
+    start sequence (language and task) and the median filter width.
+
+    Example:
+
+        model = WhisperModel("small")
+        model.alignment_scheduler = AlignmentScheduler(model.model)
+    """
+
+    def __init__(
+        self,
+        model: ctranslate2.models.Whisper,
+        max_batch_size: int = 16,
+        max_wait_time: float = 0.005,
+    ):
+        """Initializes the scheduler.
+
+        Args:
+          model: The CTranslate2 Whisper model running the alignments.
+          max_batch_size: Maximum number of token sequences aligned in a single call. A
+            request with more sequences is still aligned, in a call of its own.
+          max_wait_time: Maximum time in seconds to wait for other requests before
+            running the alignment of a request.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        self.num_calls = 0
+        self.num_requests = 0
+        self._requests = queue.Queue()
+        self._closed = False
+        # Orders the requests before the stop marker of `close`.
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="faster_whisper_alignment", daemon=True
+        )
+        self._thread.start()
+
+    def align(
+        self,
+        features: ctranslate2.StorageView,
+        start_sequence: List[int],
+        text_tokens: List[List[int]],
+        num_frames: Union[int, List[int]],
+        median_filter_width: int = 7,
+    ) -> list:
+        """Aligns the text tokens with the encoded features, see
+        `ctranslate2.models.Whisper.align`. Blocks until the batch containing this request
+        is processed."""
+        if isinstance(num_frames, int):
+            num_frames = [num_frames] * len(text_tokens)
+
+        request = _AlignmentRequest(
+            features=features,
+            start_sequence=list(start_sequence),
+            text_tokens=text_tokens,
+            num_frames=list(num_frames),
+            median_filter_width=median_filter_width,
+            future=Future(),
+        )
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The alignment scheduler is closed")
+            self._requests.put(request)
+        return request.future.result()
+
+    def close(self):
+        """Stops the scheduler thread once the pending requests are processed."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requests.put(None)
+        self._thread.join()
+
+    def _run(self):
+        running = True
+        next_request = None
+
+        while running:
+            request = next_request or self._requests.get()
+            next_request = None
+            if request is None:
+                break
+
+            batch = [request]
+            batch_size = len(request.text_tokens)
+            deadline = time.monotonic() + self.max_wait_time
+
+            while batch_size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    running = False
+                    break
+                if batch_size + len(request.text_tokens) > self.max_batch_size:
+                    # Starts the next batch.
+                    next_request = request
+                    break
+                batch.append(request)
+                batch_size += len(request.text_tokens)
+
+            groups = {}
+            for request in batch:
+                key = (
+                    tuple(request.start_sequence),
+                    request.median_filter_width,
+                    tuple(request.features.shape[1:]),
+                )
+                groups.setdefault(key, []).append(request)
+
+            for requests in groups.values():
+                self._align(requests)
+
+    def _align(self, requests: List[_AlignmentRequest]):
+        self.num_calls += 1
+        self.num_requests += len(requests)
+
+        try:
+            if len(requests) == 1:
+                features = requests[0].features
+            else:
+                # Encoder outputs are stacked on the CPU since they may come from
+                # different devices, and in float32 since the array interface does not
+                # support bfloat16.
+                dtype = requests[0].features.dtype
+                features = ctranslate2.StorageView.from_array(
+                    np.concatenate(
+                        [
+                            np.asarray(
+                                request.features.to_device(ctranslate2.Device.cpu).to(
+                                    ctranslate2.DataType.float32
+                                )
+                            )
+                            for request in requests
+                        ]
+                    )
+                ).to(dtype)
+
+            results = self.model.align(
+                features,
+                requests[0].start_sequence,
+                [tokens for request in requests for tokens in request.text_tokens],
+                [frames for request in requests for frames in request.num_frames],
+                median_filter_width=requests[0].median_filter_width,
+            )
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in requests:
+            size = len(request.text_tokens)
+            request.future.set_result(results[offset : offset + size])
+            offset += size
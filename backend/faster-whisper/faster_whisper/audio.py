@@ -7,10 +7,9 @@ However, the API is quite low-level so we need to manipulate audio frames direct
 """
 
 import gc
-import io
 import itertools
 
-from typing import BinaryIO, Union
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
 
 import av
 import numpy as np
@@ -20,13 +19,19 @@ def decode_audio(
     input_file: Union[str, BinaryIO],
     sampling_rate: int = 16000,
     split_stereo: bool = False,
+    gc_collect: bool = True,
 ):
     """Decodes the audio.
 
+    The decoded samples are converted and written directly into a float32 array that is
+    preallocated from the duration of the audio stream, when it is known.
+
     Args:
       input_file: Path to the input file or a file-like object.
       sampling_rate: Resample the audio to this sample rate.
       split_stereo: Return separate left and right channels.
+      gc_collect: Run the garbage collector after decoding to free the resampler
+        (see `decode_audio_blocks`).
 
     Returns:
       A float32 Numpy array.
@@ -34,46 +39,161 @@ def decode_audio(
       If `split_stereo` is enabled, the function returns a 2-tuple with the
       separated left and right channels.
     """
+    blocks = _decode_s16(input_file, sampling_rate, split_stereo, gc_collect)
+    size = next(blocks)
+    if size is None:
+        size = sampling_rate * 60 * (2 if split_stereo else 1)
+
+    audio = np.empty(size, dtype=np.float32)
+    offset = 0
+
+    for block in blocks:
+        if offset + block.size > audio.size:
+            grown_audio = np.empty(
+                max(audio.size * 2, offset + block.size), dtype=np.float32
+            )
+            grown_audio[:offset] = audio[:offset]
+            audio = grown_audio
+
+        # Convert s16 back to f32.
+        np.multiply(
+            block,
+            np.float32(1 / 32768.0),
+            out=audio[offset : offset + block.size],
+            casting="unsafe",
+        )
+        offset += block.size
+
+    if offset < audio.size // 2:
+        audio = audio[:offset].copy()  # Do not keep a much larger allocation alive.
+    else:
+        audio = audio[:offset]
+
+    if split_stereo:
+        left_channel = audio[0::2]
+        right_channel = audio[1::2]
+        return left_channel, right_channel
+
+    return audio
+
+
+def decode_audio_blocks(
+    input_file: Union[str, BinaryIO],
+    sampling_rate: int = 16000,
+    split_stereo: bool = False,
+    gc_collect: bool = True,
+) -> Iterator[Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]]:
+    """Decodes the audio block by block, without holding the whole waveform in memory.
+
+    Args:
+      input_file: Path to the input file or a file-like object.
+      sampling_rate: Resample the audio to this sample rate.
+      split_stereo: Yield separate left and right channels.
+      gc_collect: Run the garbage collector once the audio is decoded. Some objects
+        related to the resampler are only freed by the garbage collector, but a full
+        collection after every decoding can be a noticeable pause in a server.
+
+    Yields:
+      Float32 Numpy arrays of consecutive samples, or 2-tuples with the left and right
+      channels if `split_stereo` is enabled.
+    """
+    blocks = _decode_s16(input_file, sampling_rate, split_stereo, gc_collect)
+    next(blocks)
+
+    for block in blocks:
+        # Convert s16 back to f32.
+        block = np.multiply(block, np.float32(1 / 32768.0), dtype=np.float32)
+
+        if split_stereo:
+            yield block[0::2], block[1::2]
+        else:
+            yield block
+
+
+def open_pcm(
+    path: str,
+    dtype: str = "int16",
+    offset: int = 0,
+) -> np.memmap:
+    """Opens a headerless mono PCM file sampled at 16 kHz as a read-only memory map.
+
+    The samples are read from the disk when they are accessed, so long recordings can
+    be transcribed without loading the whole waveform in memory: the feature extraction
+    and the VAD read the memory map block by block.
+
+    Args:
+      path: Path to the PCM file, e.g. produced by
+        ``ffmpeg -i input -ac 1 -ar 16000 -f s16le output.pcm``.
+      dtype: Sample format, "int16" (s16le) or "float32" (f32le).
+      offset: Number of bytes to skip at the beginning of the file, e.g. 44 for the
+        header of a WAV file.
+
+    Returns:
+      A 1D Numpy memory map of the samples.
+    """
+    if dtype not in ("int16", "float32"):
+        raise ValueError(f"Unsupported PCM sample format: {dtype}")
+
+    return np.memmap(
+        path, dtype=np.dtype(dtype).newbyteorder("<"), mode="r", offset=offset
+    )
+
+
+def to_float32(audio: np.ndarray) -> np.ndarray:
+    """Converts a waveform to float32, scaling int16 samples to [-1, 1).
+
+    Float32 arrays are returned as is, so memory maps are only read when needed.
+    """
+    if audio.dtype == np.int16:
+        return np.multiply(audio, np.float32(1 / 32768.0), dtype=np.float32)
+    return audio.astype(np.float32, copy=False)
+
+
+def _decode_s16(input_file, sampling_rate, split_stereo, gc_collect):
+    """Yields the estimated number of decoded values (or None if the duration is
+    unknown), then the decoded s16 samples as flat arrays."""
     resampler = av.audio.resampler.AudioResampler(
         format="s16",
         layout="mono" if not split_stereo else "stereo",
         rate=sampling_rate,
     )
 
-    raw_buffer = io.BytesIO()
-    dtype = None
+    try:
+        with av.open(input_file, mode="r", metadata_errors="ignore") as container:
+            yield _estimate_size(container, sampling_rate, 2 if split_stereo else 1)
 
-    with av.open(input_file, mode="r", metadata_errors="ignore") as container:
-        frames = container.decode(audio=0)
-        frames = _ignore_invalid_frames(frames)
-        frames = _group_frames(frames, 500000)
-        frames = _resample_frames(frames, resampler)
+            frames = container.decode(audio=0)
+            frames = _ignore_invalid_frames(frames)
+            frames = _group_frames(frames, 500000)
+            frames = _resample_frames(frames, resampler)
 
-        for frame in frames:
-            array = frame.to_ndarray()
-            dtype = array.dtype
-            raw_buffer.write(array)
+            for frame in frames:
+                yield frame.to_ndarray().reshape(-1)
+    finally:
+        # It appears that some objects related to the resampler are not freed
+        # unless the garbage collector is manually run.
+        # https://github.com/SYSTRAN/faster-whisper/issues/390
+        # note that this slows down loading the audio a little bit
+        # if that is a concern, please use ffmpeg directly as in here:
+        # https://github.com/openai/whisper/blob/25639fc/whisper/audio.py#L25-L62
+        # This also runs when the generator is closed early or decoding fails.
+        del resampler
+        if gc_collect:
+            gc.collect()
 
-    # It appears that some objects related to the resampler are not freed
-    # unless the garbage collector is manually run.
-    # https://github.com/SYSTRAN/faster-whisper/issues/390
-    # note that this slows down loading the audio a little bit
-    # if that is a concern, please use ffmpeg directly as in here:
-    # https://github.com/openai/whisper/blob/25639fc/whisper/audio.py#L25-L62
-    del resampler
-    gc.collect()
 
-    audio = np.frombuffer(raw_buffer.getbuffer(), dtype=dtype)
+def _estimate_size(container, sampling_rate: int, num_channels: int) -> Optional[int]:
+    stream = container.streams.audio[0]
 
-    # Convert s16 back to f32.
-    audio = audio.astype(np.float32) / 32768.0
+    if stream.duration is not None and stream.time_base is not None:
+        duration = float(stream.duration * stream.time_base)
+    elif container.duration is not None:
+        duration = container.duration / av.time_base
+    else:
+        return None
 
-    if split_stereo:
-        left_channel = audio[0::2]
-        right_channel = audio[1::2]
-        return left_channel, right_channel
-
-    return audio
+    # Leave some room for the samples flushed by the resampler.
+    return (int(duration * sampling_rate) + sampling_rate // 10) * num_channels
 
 
 def _ignore_invalid_frames(frames):
@@ -108,10 +228,24 @@ def _resample_frames(frames, resampler):
         yield from resampler.resample(frame)
 
 
-def pad_or_trim(array, length: int = 3000, *, axis: int = -1):
+def pad_or_trim(
+    array, length: int = 3000, *, axis: int = -1, out: Optional[np.ndarray] = None
+):
     """
     Pad or trim the Mel features array to 3000, as expected by the encoder.
+
+    If `out` is set, the result is written into this array, which must have the padded
+    shape, and it is returned. It avoids allocating a new array for every window.
     """
+    if out is not None:
+        size = min(array.shape[axis], length)
+        index = [slice(None)] * array.ndim
+        index[axis] = slice(0, size)
+        out[tuple(index)] = array[tuple(index)]
+        index[axis] = slice(size, None)
+        out[tuple(index)] = 0
+        return out
+
     if array.shape[axis] > length:
         array = array.take(indices=range(length), axis=axis)
 
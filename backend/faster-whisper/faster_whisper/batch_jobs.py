@@ -0,0 +1,508 @@
+"""Batch transcription of many audio files.
+
+The audio files are decoded, filtered with the VAD and converted to features in a pool
+of worker processes. The main process transcribes the speech chunks of all the files in
+shared batches with a BatchedInferencePipeline, so that short files still fill the batches.
+
+The results are appended as JSON lines to ``transcripts.jsonl`` in the output directory,
+one line per file, and optionally written as SRT files mirroring the directories of the
+audio files. An interrupted job is resumed by running it again: the files already in
+``transcripts.jsonl`` are skipped.
+
+Usage:
+
+    python -m faster_whisper.batch_jobs manifest.txt output_dir --model large-v3
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+import numpy as np
+
+from faster_whisper.audio import decode_audio, pad_or_trim
+from faster_whisper.feature_extractor import FeatureExtractor
+from faster_whisper.transcribe import (
+    BatchedInferencePipeline,
+    TranscriptionOptions,
+    WhisperModel,
+)
+from faster_whisper.utils import format_timestamp, get_logger
+from faster_whisper.vad import (
+    VadOptions,
+    collect_chunks,
+    get_speech_timestamps,
+    merge_segments,
+)
+
+TRANSCRIPTS_FILENAME = "transcripts.jsonl"
+
+
+@dataclass
+class PreparedAudio:
+    path: str
+    duration: float
+    features: List[np.ndarray] = field(default_factory=list)
+    chunks_metadata: List[dict] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class _FileState:
+    prepared: PreparedAudio
+    segments: List[Optional[List[dict]]]
+    remaining: int
+
+
+def _chunk_duration(state: _FileState, index: int) -> float:
+    metadata = state.prepared.chunks_metadata[index]
+    return metadata["end_time"] - metadata["start_time"]
+
+
+def read_manifest(path: str) -> List[str]:
+    """Reads a manifest with one audio path per line. Empty lines and lines starting
+    with # are ignored, and relative paths are relative to the manifest."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    paths = []
+    with open(path, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(os.path.join(base_dir, line))
+    return paths
+
+
+def read_completed_paths(transcripts_path: str) -> Set[str]:
+    """Returns the paths of the files successfully transcribed in a transcripts.jsonl
+    file. The files that failed are transcribed again."""
+    completed = set()
+    if not os.path.exists(transcripts_path):
+        return completed
+    with open(transcripts_path, encoding="utf-8") as transcripts:
+        for line in transcripts:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted run.
+                continue
+            if "error" not in record:
+                completed.add(record["path"])
+    return completed
+
+
+def prepare_audio(
+    path: str,
+    vad_options: VadOptions,
+    feature_extractor: FeatureExtractor,
+) -> PreparedAudio:
+    """Decodes an audio file, splits it into speech chunks with the VAD and computes
+    the features of the chunks, like BatchedInferencePipeline.transcribe."""
+    sampling_rate = feature_extractor.sampling_rate
+    audio = decode_audio(path, sampling_rate=sampling_rate, gc_collect=False)
+    duration = audio.shape[0] / sampling_rate
+
+    active_segments = get_speech_timestamps(audio, vad_options)
+    clip_timestamps = merge_segments(active_segments, vad_options)
+    if not clip_timestamps:
+        return PreparedAudio(path=path, duration=duration)
+
+    audio_chunks, chunks_metadata = collect_chunks(audio, clip_timestamps)
+    features = [feature_extractor(chunk)[..., :-1] for chunk in audio_chunks]
+    return PreparedAudio(
+        path=path,
+        duration=duration,
+        features=features,
+        chunks_metadata=chunks_metadata,
+    )
+
+
+_worker_feature_extractor: Optional[FeatureExtractor] = None
+
+
+def _init_worker(feat_kwargs: dict):
+    global _worker_feature_extractor
+    _worker_feature_extractor = FeatureExtractor(**feat_kwargs)
+
+
+def _prepare_in_worker(path: str, vad_options: VadOptions) -> PreparedAudio:
+    try:
+        return prepare_audio(path, vad_options, _worker_feature_extractor)
+    except Exception as e:
+        return PreparedAudio(path=path, duration=0.0, error=f"{type(e).__name__}: {e}")
+
+
+def write_srt(path: str, segments: List[dict]):
+    with open(path, "w", encoding="utf-8") as srt:
+        for i, segment in enumerate(segments, start=1):
+            start = format_timestamp(segment["start"], True, ",")
+            end = format_timestamp(segment["end"], True, ",")
+            srt.write(f"{i}\n{start} --> {end}\n{segment['text'].strip()}\n\n")
+
+
+class BatchTranscriptionRunner:
+    """
+    Transcribes a list of audio files with shared batches.
+
+    Args:
+      model: The WhisperModel instance.
+      output_dir: Directory of transcripts.jsonl and of the SRT files.
+      batch_size: Number of speech chunks transcribed at once.
+      num_workers: Number of processes decoding the audio and computing the features.
+        Defaults to the number of CPUs.
+      language: Language of the audio files. If not set, the language of each chunk is
+        detected, and the language of a file is the language of most of its speech.
+      task: Task to execute (transcribe or translate).
+      beam_size: Beam size to use for decoding.
+      initial_prompt: Optional text to provide as a prompt for every chunk.
+      hotwords: Hotwords/hint phrases to provide the model with.
+      without_timestamps: Only sample text tokens.
+      vad_parameters: Dictionary of Silero VAD parameters or VadOptions class.
+      write_srt: Also write a <file name>.srt file for each audio file, in the same
+        directory relative to the output directory as the audio file relative to the
+        common directory of the audio files, so that files of the same name do not
+        overwrite each other's SRT file.
+      sort_by_length: Batch together the queued chunks of similar durations, so that
+        short chunks do not wait in a batch for the decoding of long chunks.
+      max_pending_files: Number of files prepared ahead by the workers. Defaults to
+        4 times the number of workers.
+    """
+
+    def __init__(
+        self,
+        model: WhisperModel,
+        output_dir: str,
+        batch_size: int = 16,
+        num_workers: Optional[int] = None,
+        language: Optional[str] = None,
+        task: str = "transcribe",
+        beam_size: int = 5,
+        initial_prompt: Optional[str] = None,
+        hotwords: Optional[str] = None,
+        without_timestamps: bool = True,
+        vad_parameters: Optional[Union[dict, VadOptions]] = None,
+        write_srt: bool = False,
+        sort_by_length: bool = True,
+        max_pending_files: Optional[int] = None,
+    ):
+        self.model = model
+        self.pipeline = BatchedInferencePipeline(model)
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.max_pending_files = max_pending_files or 4 * self.num_workers
+        self.language = language
+        self.write_srt = write_srt
+        self.sort_by_length = sort_by_length
+        self.logger = get_logger()
+
+        chunk_length = model.feature_extractor.chunk_length
+        if vad_parameters is None:
+            vad_parameters = {}
+        elif isinstance(vad_parameters, VadOptions):
+            vad_parameters = vars(vad_parameters)
+        vad_parameters = {
+            "min_silence_duration_ms": 160,
+            **vad_parameters,
+            "max_speech_duration_s": chunk_length,
+        }
+        self.vad_options = VadOptions(**vad_parameters)
+
+        multilingual = language is None and model.model.is_multilingual
+        self.tokenizer = model.get_tokenizer(
+            task=task,
+            language=(language or "en") if model.model.is_multilingual else None,
+        )
+        self.options = TranscriptionOptions(
+            beam_size=beam_size,
+            best_of=5,
+            patience=1,
+            length_penalty=1,
+            repetition_penalty=1,
+            no_repeat_ngram_size=0,
+            log_prob_threshold=-1.0,
+            no_speech_threshold=0.6,
+            compression_ratio_threshold=2.4,
+            temperatures=[0.0],
+            fallback_concurrency=1,
+            pipelined_encoding=False,
+            initial_prompt=initial_prompt,
+            prefix=None,
+            suppress_blank=True,
+            suppress_tokens=self.tokenizer.get_suppressed_tokens((-1,)),
+            prepend_punctuations="\"'“¿([{-",
+            append_punctuations="\"'.。,，!！?？:：”)]}、",
+            max_new_tokens=None,
+            chunk_length=chunk_length,
+            hotwords=hotwords,
+            word_timestamps=False,
+            hallucination_silence_threshold=None,
+            condition_on_previous_text=False,
+            clip_timestamps=[],
+            prompt_reset_on_temperature=0.5,
+            multilingual=multilingual,
+            without_timestamps=without_timestamps,
+            max_initial_timestamp=0.0,
+        )
+
+    @property
+    def transcripts_path(self) -> str:
+        return os.path.join(self.output_dir, TRANSCRIPTS_FILENAME)
+
+    def run(self, paths: Iterable[str]) -> Dict[str, float]:
+        """Transcribes the files that are not already completed and returns statistics."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = list(paths)
+        self._input_dir = (
+            os.path.commonpath(
+                [os.path.dirname(os.path.abspath(path)) for path in paths]
+            )
+            if paths
+            else None
+        )
+        completed = read_completed_paths(self.transcripts_path)
+        pending = [path for path in paths if path not in completed]
+        self.logger.info(
+            "Transcribing %d files (%d already done)", len(pending), len(completed)
+        )
+
+        self._stats = {"files": 0, "failed": 0, "audio_duration": 0.0, "chunks": 0}
+        self._num_files = len(pending)
+        start_time = time.monotonic()
+
+        paths_iter = iter(pending)
+        futures = set()
+        queue = []
+
+        with concurrent.futures.ProcessPoolExecutor(
+            self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model.feat_kwargs,),
+        ) as executor, open(
+            self.transcripts_path, "a", encoding="utf-8"
+        ) as transcripts:
+            self._transcripts = transcripts
+            while True:
+                # Keep the workers busy, with a bounded number of prepared chunks.
+                while (
+                    len(futures) < self.max_pending_files
+                    and len(queue) < 4 * self.batch_size
+                ):
+                    path = next(paths_iter, None)
+                    if path is None:
+                        break
+                    futures.add(
+                        executor.submit(_prepare_in_worker, path, self.vad_options)
+                    )
+
+                if not futures and not queue:
+                    break
+
+                if futures:
+                    finished, futures = concurrent.futures.wait(
+                        futures,
+                        timeout=0 if len(queue) >= self.batch_size else None,
+                        return_when=concurrent.futures.FIRST_COMPLETED,
+                    )
+                    for future in finished:
+                        queue.extend(self._add_file(future.result()))
+
+                # Run a partial batch only when no more chunks are coming.
+                while len(queue) >= self.batch_size or (queue and not futures):
+                    self._run_batch(self._take_batch(queue))
+
+        self._stats["elapsed_time"] = time.monotonic() - start_time
+        return self._stats
+
+    def _add_file(self, prepared: PreparedAudio) -> List[tuple]:
+        if prepared.error is not None:
+            self.logger.warning(
+                "Failed to prepare %s: %s", prepared.path, prepared.error
+            )
+            self._stats["failed"] += 1
+            self._write_record({"path": prepared.path, "error": prepared.error})
+            return []
+
+        state = _FileState(
+            prepared=prepared,
+            segments=[None] * len(prepared.features),
+            remaining=len(prepared.features),
+        )
+        if state.remaining == 0:
+            self._complete(state)
+        return [(state, index) for index in range(len(prepared.features))]
+
+    def _take_batch(self, queue: List[tuple]) -> List[tuple]:
+        """Removes the next batch from the queue. When sorting by length, the batch has
+        the oldest chunk and the chunks of the closest durations, so that no chunk waits
+        indefinitely."""
+        if not self.sort_by_length or len(queue) <= self.batch_size:
+            batch = queue[: self.batch_size]
+            del queue[: self.batch_size]
+            return batch
+
+        durations = [_chunk_duration(state, index) for state, index in queue]
+        closest = sorted(
+            range(1, len(queue)), key=lambda i: abs(durations[i] - durations[0])
+        )
+        selected = {0, *closest[: self.batch_size - 1]}
+        batch = [item for i, item in enumerate(queue) if i in selected]
+        queue[:] = [item for i, item in enumerate(queue) if i not in selected]
+        return batch
+
+    def _run_batch(self, items: List[tuple]):
+        n_mels = self.model.model.n_mels
+        features = np.empty((len(items), n_mels, 3000), dtype=np.float32)
+        for (state, index), out in zip(items, features):
+            pad_or_trim(state.prepared.features[index], out=out)
+
+        chunks_metadata = [
+            state.prepared.chunks_metadata[index] for state, index in items
+        ]
+        outputs = self.pipeline.forward(
+            features, self.tokenizer, chunks_metadata, self.options
+        )
+        self._stats["chunks"] += len(items)
+
+        for (state, index), segments in zip(items, outputs):
+            state.segments[index] = segments
+            # Release the features of the chunk as soon as it is transcribed.
+            state.prepared.features[index] = None
+            state.remaining -= 1
+            if state.remaining == 0:
+                self._complete(state)
+
+    def _complete(self, state: _FileState):
+        prepared = state.prepared
+        segments = [
+            {
+                "start": round(segment["start"], 3),
+                "end": round(segment["end"], 3),
+                "text": segment["text"],
+                "avg_logprob": segment["avg_logprob"],
+                "no_speech_prob": segment["no_speech_prob"],
+                "language": segment.get("language", self.language),
+            }
+            for chunk_segments in state.segments
+            for segment in chunk_segments
+        ]
+        duration_after_vad = sum(
+            metadata["end_time"] - metadata["start_time"]
+            for metadata in prepared.chunks_metadata
+        )
+        self._write_record(
+            {
+                "path": prepared.path,
+                "duration": prepared.duration,
+                "duration_after_vad": duration_after_vad,
+                "language": self.language or self._file_language(state),
+                "segments": segments,
+            }
+        )
+        if self.write_srt:
+            relative_path = os.path.relpath(
+                os.path.abspath(prepared.path), self._input_dir
+            )
+            srt_path = os.path.join(
+                self.output_dir, os.path.splitext(relative_path)[0] + ".srt"
+            )
+            os.makedirs(os.path.dirname(srt_path), exist_ok=True)
+            write_srt(srt_path, segments)
+
+        self._stats["files"] += 1
+        self._stats["audio_duration"] += prepared.duration
+        self.logger.info(
+            "[%d/%d] %s: %s of audio, %d chunks, %d segments",
+            self._stats["files"] + self._stats["failed"],
+            self._num_files,
+            prepared.path,
+            format_timestamp(prepared.duration),
+            len(prepared.chunks_metadata),
+            len(segments),
+        )
+
+    def _file_language(self, state: _FileState) -> Optional[str]:
+        """Returns the language detected for most of the speech of a file."""
+        durations = collections.Counter()
+        for index, chunk_segments in enumerate(state.segments):
+            if chunk_segments and chunk_segments[0].get("language"):
+                durations[chunk_segments[0]["language"]] += _chunk_duration(
+                    state, index
+                )
+        return durations.most_common(1)[0][0] if durations else None
+
+    def _write_record(self, record: dict):
+        self._transcripts.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._transcripts.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest", help="File with one audio path per line.")
+    parser.add_argument("output_dir", help="Directory of the transcripts.")
+    parser.add_argument("--model", default="large-v3", help="Model size or path.")
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--compute-type", default="default")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=None,
+        help="Number of processes decoding the audio. Defaults to the number of CPUs.",
+    )
+    parser.add_argument("--language", default=None)
+    parser.add_argument(
+        "--task", default="transcribe", choices=["transcribe", "translate"]
+    )
+    parser.add_argument("--beam-size", type=int, default=5)
+    parser.add_argument("--initial-prompt", default=None)
+    parser.add_argument("--hotwords", default=None)
+    parser.add_argument(
+        "--srt", action="store_true", help="Also write an SRT file per audio file."
+    )
+    parser.add_argument(
+        "--no-sort-by-length",
+        dest="sort_by_length",
+        action="store_false",
+        help="Batch the chunks in arrival order instead of by similar durations.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+    logger = get_logger()
+    logger.setLevel(logging.INFO)
+
+    model = WhisperModel(args.model, device=args.device, compute_type=args.compute_type)
+    runner = BatchTranscriptionRunner(
+        model,
+        args.output_dir,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        language=args.language,
+        task=args.task,
+        beam_size=args.beam_size,
+        initial_prompt=args.initial_prompt,
+        hotwords=args.hotwords,
+        write_srt=args.srt,
+        sort_by_length=args.sort_by_length,
+    )
+    stats = runner.run(read_manifest(args.manifest))
+    logger.info(
+        "Transcribed %d files (%d failed), %s of audio in %.1f s",
+        stats["files"],
+        stats["failed"],
+        format_timestamp(stats["audio_duration"]),
+        stats["elapsed_time"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,38 @@
+from typing import Optional, Sequence
+from warnings import warn
+
 import numpy as np
 
+from faster_whisper.audio import to_float32
+
+try:
+    import scipy.fft as _scipy_fft
+except ImportError:
+    _scipy_fft = None
+
+
+def _read_samples(
+    chunks: Sequence[np.ndarray], offsets: np.ndarray, start: int, end: int
+) -> np.ndarray:
+    """Returns the samples [start, end) of the concatenated chunks as float32."""
+    if start >= end:
+        return np.empty(0, dtype=np.float32)
+
+    first = max(int(np.searchsorted(offsets, start, side="right")) - 1, 0)
+    last = int(np.searchsorted(offsets, end, side="left"))
+    if last - first <= 1:
+        chunk_start = offsets[first]
+        return to_float32(chunks[first][start - chunk_start : end - chunk_start])
+
+    samples = np.empty(end - start, dtype=np.float32)
+    for i in range(first, last):
+        chunk_start = max(offsets[i], start)
+        chunk_end = min(offsets[i + 1], end)
+        samples[chunk_start - start : chunk_end - start] = to_float32(
+            chunks[i][chunk_start - offsets[i] : chunk_end - offsets[i]]
+        )
+    return samples
+
 
 class FeatureExtractor:
     def __init__(
@@ -9,6 +42,7 @@ class FeatureExtractor:
         hop_length=160,
         chunk_length=30,
         n_fft=400,
+        fft_workers: Optional[int] = None,
     ):
         self.n_fft = n_fft
         self.hop_length = hop_length
@@ -20,6 +54,28 @@ class FeatureExtractor:
         self.mel_filters = self.get_mel_filters(
             sampling_rate, n_fft, n_mels=feature_size
         ).astype("float32")
+        self.window = np.hanning(n_fft + 1)[:-1].astype("float32")
+        self.fft_workers = fft_workers
+        # Number of frames computed at once for long waveforms.
+        self.block_frames = self.nb_max_frames
+
+    def get_num_samples(self, chunk_length: Optional[int] = None) -> int:
+        """Returns the number of audio samples in a chunk.
+
+        Arguments:
+          chunk_length: Chunk length in seconds. Defaults to the extractor chunk length.
+        """
+        if chunk_length is None:
+            chunk_length = self.chunk_length
+        return chunk_length * self.sampling_rate
+
+    def get_nb_max_frames(self, chunk_length: Optional[int] = None) -> int:
+        """Returns the number of feature frames in a chunk.
+
+        Arguments:
+          chunk_length: Chunk length in seconds. Defaults to the extractor chunk length.
+        """
+        return self.get_num_samples(chunk_length) // self.hop_length
 
     @staticmethod
     def get_mel_filters(sr, n_fft, n_mels=128):
@@ -195,36 +251,351 @@ class FeatureExtractor:
 
         return output if return_complex else np.real(output)
 
-    def __call__(self, waveform: np.ndarray, padding=160, chunk_length=None):
+    def _frames(self, waveform: np.ndarray) -> np.ndarray:
+        """Returns the windowed STFT frames of a 1D or 2D (batch) float32 waveform.
+
+        The last frame is not computed since it is dropped from the spectrogram.
+        """
+        pad_amount = self.n_fft // 2
+        pad_widths = [(0, 0)] * (waveform.ndim - 1) + [(pad_amount, pad_amount)]
+        waveform = np.pad(waveform, pad_widths, mode="reflect")
+
+        n_frames = (waveform.shape[-1] - self.n_fft) // self.hop_length
+        frames = np.lib.stride_tricks.as_strided(
+            waveform,
+            waveform.shape[:-1] + (n_frames, self.n_fft),
+            waveform.strides[:-1]
+            + (self.hop_length * waveform.strides[-1], waveform.strides[-1]),
+            writeable=False,
+        )
+        return frames * self.window
+
+    def _power_spectrum(self, frames: np.ndarray) -> np.ndarray:
+        if _scipy_fft is not None:
+            spectrum = _scipy_fft.rfft(frames, axis=-1, workers=self.fft_workers)
+        else:
+            spectrum = np.fft.rfft(frames, axis=-1)
+
+        power = np.square(spectrum.real)
+        power += np.square(spectrum.imag)
+        return power.astype(np.float32, copy=False)
+
+    def _log10_mel(
+        self, power: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        log_spec = np.matmul(self.mel_filters, np.swapaxes(power, -1, -2), out=out)
+
+        np.maximum(log_spec, 1e-10, out=log_spec)
+        np.log10(log_spec, out=log_spec)
+        return log_spec
+
+    @staticmethod
+    def _normalize(log_spec: np.ndarray) -> np.ndarray:
+        if log_spec.ndim == 3:
+            floor = log_spec.max(axis=(1, 2), keepdims=True) - 8.0
+        else:
+            floor = log_spec.max() - 8.0
+        np.maximum(log_spec, floor, out=log_spec)
+        log_spec += 4.0
+        log_spec /= 4.0
+
+        return log_spec
+
+    def _log_mel(
+        self, power: np.ndarray, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        return self._normalize(self._log10_mel(power, out=out))
+
+    def __call__(
+        self,
+        waveform: np.ndarray,
+        padding=160,
+        chunk_length=None,
+        out: Optional[np.ndarray] = None,
+    ):
         """
         Compute the log-Mel spectrogram of the provided audio.
+
+        If `out` is set, the features are written into this float32 array of shape
+        (n_mels, n_frames) and it is returned.
+
+        The feature extractor is not modified so it can be shared between threads.
+        `chunk_length` is deprecated and ignored: use `get_num_samples` and
+        `get_nb_max_frames` to get the chunk size for a given chunk length.
         """
 
         if chunk_length is not None:
-            self.n_samples = chunk_length * self.sampling_rate
-            self.nb_max_frames = self.n_samples // self.hop_length
+            warn(
+                "The chunk_length argument of FeatureExtractor.__call__ is deprecated and "
+                "ignored, use FeatureExtractor.get_nb_max_frames(chunk_length) instead",
+                DeprecationWarning,
+                2,
+            )
 
-        if waveform.dtype is not np.float32:
-            waveform = waveform.astype(np.float32)
+        num_frames = (waveform.shape[-1] + padding) // self.hop_length
+        if waveform.ndim == 1 and num_frames > 2 * self.block_frames:
+            return self._log_mel_by_blocks([waveform], padding, out=out)
+
+        waveform = to_float32(waveform)
 
         if padding:
             waveform = np.pad(waveform, (0, padding))
 
-        window = np.hanning(self.n_fft + 1)[:-1].astype("float32")
+        power = self._power_spectrum(self._frames(waveform))
+        return self._log_mel(power, out=out)
 
-        stft = self.stft(
-            waveform,
-            self.n_fft,
-            self.hop_length,
-            window=window,
-            return_complex=True,
-        ).astype("complex64")
-        magnitudes = np.abs(stft[..., :-1]) ** 2
+    def concatenated(
+        self,
+        chunks: Sequence[np.ndarray],
+        padding=160,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Compute the log-Mel spectrogram of the concatenation of 1D audio chunks, e.g. the
+        speech chunks kept by the VAD, without concatenating them.
+
+        The features are computed block by block from views of the chunks and are
+        identical to the features of the concatenated audio.
+        """
+        return self._log_mel_by_blocks(chunks, padding, out=out)
 
-        mel_spec = self.mel_filters @ magnitudes
+    def _log_mel_by_blocks(
+        self,
+        chunks: Sequence[np.ndarray],
+        padding: int,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Computes the features of the concatenated chunks block by block, so that only a
+        block of the waveform is converted to float32 and framed at a time. The chunks can
+        be memory maps that are read lazily."""
+        offsets = np.cumsum([0] + [chunk.shape[0] for chunk in chunks])
+        num_samples = int(offsets[-1])
+        length = num_samples + padding
+        num_frames = length // self.hop_length
+
+        if out is None:
+            out = np.empty((self.mel_filters.shape[0], num_frames), dtype=np.float32)
+
+        pad_amount = self.n_fft // 2
+
+        for start in range(0, num_frames, self.block_frames):
+            end = min(start + self.block_frames, num_frames)
+
+            # Samples of the frames [start, end) in the original waveform coordinates,
+            # which extend beyond the waveform for the reflect padding.
+            first = start * self.hop_length - pad_amount
+            last = (end - 1) * self.hop_length + self.n_fft - pad_amount
+            block = _read_samples(
+                chunks, offsets, max(first, 0), min(last, num_samples)
+            )
+            if last > num_samples:
+                block = np.pad(block, (0, min(last, length) - num_samples))
+            if first < 0 or last > length:
+                block = np.pad(
+                    block, (max(-first, 0), max(last - length, 0)), "reflect"
+                )
 
-        log_spec = np.log10(np.clip(mel_spec, a_min=1e-10, a_max=None))
-        log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
-        log_spec = (log_spec + 4.0) / 4.0
+            frames = np.lib.stride_tricks.as_strided(
+                block,
+                (end - start, self.n_fft),
+                (self.hop_length * block.strides[0], block.strides[0]),
+                writeable=False,
+            )
+            power = self._power_spectrum(frames * self.window)
+            self._log10_mel(power, out=out[:, start:end])
 
-        return log_spec
+        return self._normalize(out)
+
+    def batch(self, waveforms: np.ndarray, padding=160) -> np.ndarray:
+        """
+        Compute the log-Mel spectrograms of a stack of audio chunks with the same length.
+
+        Arguments:
+          waveforms: Float array of shape (batch_size, n_samples).
+          padding: Number of zero samples appended to each chunk.
+
+        Returns:
+          A float32 array of shape (batch_size, n_mels, n_frames). Each item is identical
+          to the output of calling the feature extractor on the chunk alone.
+        """
+        waveforms = np.asarray(waveforms, dtype=np.float32)
+        if waveforms.ndim != 2:
+            raise ValueError(
+                f"Expected a 2D array of waveforms, but got {waveforms.ndim}D array"
+            )
+
+        if padding:
+            waveforms = np.pad(waveforms, ((0, 0), (0, padding)))
+
+        power = self._power_spectrum(self._frames(waveforms))
+        return self._log_mel(power)
+
+
+class StreamingFeatureExtractor:
+    """Incrementally computes the log-Mel spectrogram of a growing audio stream.
+
+    Only the STFT frames covered by newly appended samples are computed: the extractor
+    keeps the last `n_fft - hop_length` samples of overlap between calls and stores the
+    log-Mel frames before normalization. The dynamic range clamp
+    (`log_spec.max() - 8.0`) is applied when features are requested, over the requested
+    window of frames, so that it is consistent with extracting that window at once.
+
+    After `flush()`, the features of the whole stream are the same as the output of
+    `FeatureExtractor` on the concatenated audio.
+    """
+
+    def __init__(self, feature_extractor: FeatureExtractor, padding: int = 160):
+        self.feature_extractor = feature_extractor
+        self.padding = padding
+        self.reset()
+
+    def reset(self):
+        """Clears the stream state."""
+        self.num_samples = 0
+        self.frame_offset = 0
+        self.finished = False
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._started = False
+        self._log_spec = np.zeros(
+            (self.feature_extractor.mel_filters.shape[0], 0), dtype=np.float32
+        )
+        self._num_stored_frames = 0
+
+    @property
+    def num_frames(self) -> int:
+        """Total number of frames computed since the start of the stream."""
+        return self.frame_offset + self._num_stored_frames
+
+    def append(self, waveform: np.ndarray) -> int:
+        """Appends audio samples to the stream and computes the new frames.
+
+        Arguments:
+          waveform: 1D float array sampled at the feature extractor sampling rate.
+
+        Returns:
+          The number of new frames.
+        """
+        if self.finished:
+            raise RuntimeError("Cannot append audio to a flushed stream, call reset()")
+
+        waveform = np.asarray(waveform, dtype=np.float32)
+        self.num_samples += waveform.shape[0]
+        self._pending = np.concatenate([self._pending, waveform])
+
+        pad_amount = self.feature_extractor.n_fft // 2
+        if not self._started:
+            if self._pending.shape[0] <= pad_amount:
+                return 0
+            # Same left padding as the offline extractor (reflection of the first samples).
+            self._pending = np.concatenate(
+                [self._pending[pad_amount:0:-1], self._pending]
+            )
+            self._started = True
+
+        return self._process_pending()
+
+    def flush(self) -> int:
+        """Computes the last frames of the stream, using the same zero and reflect padding
+        as the offline feature extractor. No audio can be appended afterwards.
+
+        Returns:
+          The number of new frames.
+        """
+        if self.finished:
+            return 0
+
+        self.finished = True
+        fe = self.feature_extractor
+        pad_amount = fe.n_fft // 2
+        expected_frames = (self.num_samples + self.padding) // fe.hop_length
+
+        if not self._started:
+            # The stream is too short to be processed incrementally.
+            waveform = np.pad(self._pending, (0, self.padding))
+            return self._store(fe._log10_mel(fe._power_spectrum(fe._frames(waveform))))
+
+        pending = np.pad(self._pending, (0, self.padding))
+        pending = np.concatenate([pending, pending[-2 : -pad_amount - 2 : -1]])
+        self._pending = pending
+
+        num_new_frames = self._process_pending(
+            max_frames=expected_frames - self.num_frames
+        )
+        self._pending = np.zeros(0, dtype=np.float32)
+        return num_new_frames
+
+    def features(self, start: Optional[int] = None, end: Optional[int] = None):
+        """Returns the normalized log-Mel spectrogram of a window of frames.
+
+        Arguments:
+          start: Index of the first frame, counted from the start of the stream.
+            Defaults to the first frame that was not trimmed.
+          end: Index of the frame after the last one. Defaults to the number of frames.
+
+        Returns:
+          A float32 array of shape (n_mels, end - start).
+        """
+        start = self.frame_offset if start is None else start
+        end = self.num_frames if end is None else end
+        if start < self.frame_offset:
+            raise ValueError(
+                "Frame %d was trimmed, the first available frame is %d"
+                % (start, self.frame_offset)
+            )
+
+        log_spec = self._log_spec[
+            :, start - self.frame_offset : end - self.frame_offset
+        ].copy()
+        if log_spec.shape[-1] == 0:
+            return log_spec
+
+        return self.feature_extractor._normalize(log_spec)
+
+    def trim(self, frame_index: int):
+        """Discards the frames before `frame_index` to bound the memory usage."""
+        num_frames = min(frame_index, self.num_frames) - self.frame_offset
+        if num_frames <= 0:
+            return
+
+        self._log_spec = self._log_spec[:, num_frames:]
+        self._num_stored_frames -= num_frames
+        self.frame_offset += num_frames
+
+    def _process_pending(self, max_frames: Optional[int] = None) -> int:
+        fe = self.feature_extractor
+        if self._pending.shape[0] < fe.n_fft:
+            return 0
+
+        num_new_frames = (self._pending.shape[0] - fe.n_fft) // fe.hop_length + 1
+        if max_frames is not None:
+            num_new_frames = min(num_new_frames, max(max_frames, 0))
+        if num_new_frames == 0:
+            return 0
+
+        frames = np.lib.stride_tricks.as_strided(
+            self._pending,
+            (num_new_frames, fe.n_fft),
+            (fe.hop_length * self._pending.strides[0], self._pending.strides[0]),
+            writeable=False,
+        )
+        log_spec = fe._log10_mel(fe._power_spectrum(frames * fe.window))
+        self._pending = self._pending[num_new_frames * fe.hop_length :]
+
+        return self._store(log_spec)
+
+    def _store(self, log_spec: np.ndarray) -> int:
+        num_new_frames = log_spec.shape[-1]
+        size = self._num_stored_frames + num_new_frames
+
+        if size > self._log_spec.shape[-1]:
+            # Grow the storage geometrically to amortize the copies.
+            capacity = max(size, 2 * self._log_spec.shape[-1])
+            storage = np.empty((log_spec.shape[0], capacity), dtype=np.float32)
+            storage[:, : self._num_stored_frames] = self._log_spec[
+                :, : self._num_stored_frames
+            ]
+            self._log_spec = storage
+
+        self._log_spec[:, self._num_stored_frames : size] = log_spec
+        self._num_stored_frames = size
+        return num_new_frames
@@ -1,7 +1,7 @@
 import string
 
-from functools import cached_property
-from typing import List, Optional, Tuple
+from functools import cached_property, lru_cache
+from typing import Dict, List, Optional, Tuple
 
 import tokenizers
 
@@ -9,6 +9,8 @@ import tokenizers
 class Tokenizer:
     """Simple wrapper around a tokenizers.Tokenizer."""
 
+    PROMPT_CACHE_SIZE = 1024
+
     def __init__(
         self,
         tokenizer: tokenizers.Tokenizer,
@@ -39,6 +41,12 @@ class Tokenizer:
             self.language = None
             self.language_code = "en"
 
+        # Caches of this tokenizer, which are released with it.
+        self._prompt_encodings = lru_cache(maxsize=self.PROMPT_CACHE_SIZE)(
+            self._encode_tuple
+        )
+        self._suppressed_tokens: Dict[Tuple[int, ...], Tuple[int, ...]] = {}
+
     @cached_property
     def transcribe(self) -> int:
         return self.tokenizer.token_to_id("<|transcribe|>")
@@ -73,6 +81,10 @@ class Tokenizer:
 
     @property
     def sot_sequence(self) -> List[int]:
+        return list(self._sot_sequence)
+
+    @cached_property
+    def _sot_sequence(self) -> Tuple[int]:
         sequence = [self.sot]
 
         if self.language is not None:
@@ -81,11 +93,38 @@ class Tokenizer:
         if self.task is not None:
             sequence.append(self.task)
 
-        return sequence
+        return tuple(sequence)
 
     def encode(self, text: str) -> List[int]:
         return self.tokenizer.encode(text, add_special_tokens=False).ids
 
+    def encode_prompt(self, text: str) -> List[int]:
+        """Encodes a text that is likely to be encoded again, such as an initial prompt,
+        hotwords or a prefix. The last encodings are cached by the tokenizer."""
+        return list(self._prompt_encodings(text))
+
+    def _encode_tuple(self, text: str) -> Tuple[int, ...]:
+        return tuple(self.encode(text))
+
+    def get_suppressed_tokens(
+        self, suppress_tokens: Tuple[int, ...]
+    ) -> Tuple[int, ...]:
+        """Returns the sorted tokens to suppress for a `suppress_tokens` option, where -1
+        stands for the non-speech tokens, and the special tokens are always suppressed.
+        The results are cached by the tokenizer."""
+        result = self._suppressed_tokens.get(suppress_tokens)
+        if result is None:
+            tokens = {token for token in suppress_tokens if token >= 0}
+            if -1 in suppress_tokens:
+                tokens.update(self.non_speech_tokens)
+            tokens.update(
+                [self.transcribe, self.translate, self.sot, self.sot_prev, self.sot_lm]
+            )
+            result = self._suppressed_tokens.setdefault(
+                suppress_tokens, tuple(sorted(tokens))
+            )
+        return result
+
     def decode(self, tokens: List[int]) -> str:
         text_tokens = [token for token in tokens if token < self.eot]
         return self.tokenizer.decode(text_tokens)
@@ -152,8 +191,76 @@ class Tokenizer:
 
         return self.split_tokens_on_spaces(tokens)
 
+    @cached_property
+    def _token_bytes_cache(self) -> Optional[Dict[int, bytes]]:
+        # The byte representation of the tokens is only known for byte-level BPE models.
+        if not isinstance(self.tokenizer.decoder, tokenizers.decoders.ByteLevel):
+            return None
+        return {}
+
+    def _token_bytes(self, token: int) -> bytes:
+        """Returns the UTF-8 bytes that the token contributes to the decoded text."""
+        token_bytes = self._token_bytes_cache.get(token)
+
+        if token_bytes is None:
+            if token >= self.timestamp_begin:
+                token_bytes = self.decode_with_timestamps([token]).encode("utf-8")
+            else:
+                text = self.tokenizer.decode([token])
+                if "\ufffd" not in text:
+                    token_bytes = text.encode("utf-8")
+                else:
+                    # Part of a multi-byte character: map the byte-level symbols back to bytes.
+                    byte_decoder = _byte_decoder()
+                    token_bytes = bytes(
+                        byte_decoder[c] for c in self.tokenizer.id_to_token(token)
+                    )
+
+            self._token_bytes_cache[token] = token_bytes
+
+        return token_bytes
+
     def split_tokens_on_unicode(
         self, tokens: List[int]
+    ) -> Tuple[List[str], List[List[int]]]:
+        if self._token_bytes_cache is None:
+            return self._split_tokens_on_unicode_by_decoding(tokens)
+
+        decoded_full = self.decode_with_timestamps(tokens)
+        replacement_char = "\ufffd"
+
+        words = []
+        word_tokens = []
+        current_tokens = []
+        current_bytes = b""
+        unicode_offset = 0
+
+        # Walk the token bytes once and close a word as soon as the accumulated bytes form
+        # complete UTF-8 characters, or when the replacement character is also in the full
+        # decoded text (i.e. the invalid bytes are not completed by the next tokens).
+        for token in tokens:
+            current_tokens.append(token)
+            current_bytes += self._token_bytes(token)
+            decoded = current_bytes.decode("utf-8", errors="replace")
+
+            replacement_char_index = decoded.find(replacement_char)
+            if replacement_char_index >= 0:
+                replacement_char_index += unicode_offset
+
+            if replacement_char_index < 0 or (
+                replacement_char_index < len(decoded_full)
+                and decoded_full[replacement_char_index] == replacement_char
+            ):
+                words.append(decoded)
+                word_tokens.append(current_tokens)
+                current_tokens = []
+                current_bytes = b""
+                unicode_offset += len(decoded)
+
+        return words, word_tokens
+
+    def _split_tokens_on_unicode_by_decoding(
+        self, tokens: List[int]
     ) -> Tuple[List[str], List[List[int]]]:
         decoded_full = self.decode_with_timestamps(tokens)
         replacement_char = "\ufffd"
@@ -205,6 +312,24 @@ class Tokenizer:
         return words, word_tokens
 
 
+@lru_cache
+def _byte_decoder() -> Dict[str, int]:
+    """Returns the mapping from the byte-level BPE symbols to the byte values (GPT-2)."""
+    byte_values = (
+        list(range(ord("!"), ord("~") + 1))
+        + list(range(ord("¡"), ord("¬") + 1))
+        + list(range(ord("®"), ord("ÿ") + 1))
+    )
+    symbols = list(byte_values)
+    n = 0
+    for b in range(256):
+        if b not in byte_values:
+            byte_values.append(b)
+            symbols.append(256 + n)
+            n += 1
+    return {chr(symbol): b for b, symbol in zip(byte_values, symbols)}
+
+
 _TASKS = (
     "transcribe",
     "translate",
@@ -4,10 +4,11 @@ import logging
 import os
 import zlib
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, dataclass
 from inspect import signature
 from math import ceil
-from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
 from warnings import warn
 
 import ctranslate2
@@ -16,6 +17,7 @@ import tokenizers
 
 from tqdm import tqdm
 
+from faster_whisper.alignment import AlignmentScheduler
 from faster_whisper.audio import decode_audio, pad_or_trim
 from faster_whisper.feature_extractor import FeatureExtractor
 from faster_whisper.tokenizer import _LANGUAGE_CODES, Tokenizer
@@ -82,6 +84,8 @@ class TranscriptionOptions:
     condition_on_previous_text: bool
     prompt_reset_on_temperature: float
     temperatures: List[float]
+    fallback_concurrency: int
+    pipelined_encoding: bool
     initial_prompt: Optional[Union[str, Iterable[int]]]
     prefix: Optional[str]
     suppress_blank: bool
@@ -93,6 +97,7 @@ class TranscriptionOptions:
     append_punctuations: str
     multilingual: bool
     max_new_tokens: Optional[int]
+    chunk_length: int
     clip_timestamps: Union[str, List[float]]
     hallucination_silence_threshold: Optional[float]
     hotwords: Optional[str]
@@ -107,14 +112,30 @@ class TranscriptionInfo:
     all_language_probs: Optional[List[Tuple[str, float]]]
     transcription_options: TranscriptionOptions
     vad_options: VadOptions
+    # Windows decoded with a draft model and windows whose draft result was kept,
+    # counted while the segments are generated
+    draft_windows: int = 0
+    draft_accepted_windows: int = 0
 
 
 class BatchedInferencePipeline:
     def __init__(
         self,
         model,
+        sort_by_length: bool = False,
     ):
+        """Initializes the batched pipeline.
+
+        Args:
+          model: The WhisperModel instance.
+          sort_by_length: Batch together the speech chunks of similar durations, so that
+            short chunks do not wait in a batch for the decoding of long chunks. The
+            segments are still yielded in order, but a segment is only yielded once all
+            the previous chunks are transcribed. Not applied with word timestamps, whose
+            alignment depends on the previous chunk of the batch.
+        """
         self.model: WhisperModel = model
+        self.sort_by_length = sort_by_length
         self.last_speech_timestamp = 0.0
 
     def forward(self, features, tokenizer, chunks_metadata, options):
@@ -149,6 +170,7 @@ class BatchedInferencePipeline:
                         tokens=subsegment["tokens"],
                         start=subsegment["start"],
                         end=subsegment["end"],
+                        language=output["language"],
                         compression_ratio=get_compression_ratio(
                             tokenizer.decode(subsegment["tokens"])
                         ),
@@ -183,7 +205,7 @@ class BatchedInferencePipeline:
         prompt = self.model.get_prompt(
             tokenizer,
             previous_tokens=(
-                tokenizer.encode(options.initial_prompt)
+                tokenizer.encode_prompt(options.initial_prompt)
                 if options.initial_prompt is not None
                 else []
             ),
@@ -209,16 +231,20 @@ class BatchedInferencePipeline:
 
         encoder_output = self.model.encode(features)
         prompts = [prompt.copy() for _ in range(batch_size)]
+        languages = [tokenizer.language_code] * batch_size
 
         if options.multilingual:
             language_tokens = [
-                tokenizer.tokenizer.token_to_id(segment_langs[0][0])
+                segment_langs[0][0]
                 for segment_langs in self.model.model.detect_language(encoder_output)
             ]
+            languages = [language_token[2:-2] for language_token in language_tokens]
             language_token_index = prompt.index(tokenizer.language)
 
             for i, language_token in enumerate(language_tokens):
-                prompts[i][language_token_index] = language_token
+                prompts[i][language_token_index] = tokenizer.tokenizer.token_to_id(
+                    language_token
+                )
 
         results = self.model.model.generate(
             encoder_output,
@@ -237,7 +263,7 @@ class BatchedInferencePipeline:
         )
 
         output = []
-        for result in results:
+        for result, language in zip(results, languages):
             # return scores
             seq_len = len(result.sequences_ids[0])
             cum_logprob = result.scores[0] * (seq_len**options.length_penalty)
@@ -247,6 +273,7 @@ class BatchedInferencePipeline:
                     avg_logprob=cum_logprob / (seq_len + 1),
                     no_speech_prob=result.no_speech_prob,
                     tokens=result.sequences_ids[0],
+                    language=language,
                 )
             )
 
@@ -297,11 +324,15 @@ class BatchedInferencePipeline:
         hotwords: Optional[str] = None,
         language_detection_threshold: Optional[float] = 0.5,
         language_detection_segments: int = 1,
+        fallback_concurrency: int = 1,
+        pipelined_encoding: bool = False,
     ) -> Tuple[Iterable[Segment], TranscriptionInfo]:
         """transcribe audio in chunks in batched fashion and return with language info.
 
         Arguments:
             audio: Path to the input file (or a file-like object), or the audio waveform.
+              The waveform can be an int16 array or a memory map returned by `open_pcm`,
+              which is read block by block.
             language: The language spoken in the audio. It should be a language code such
                 as "en" or "fr". If not set, the language will be detected in the first 30 seconds
                 of audio.
@@ -337,8 +368,8 @@ class BatchedInferencePipeline:
                 parameters and default values in the class `VadOptions`).
             max_new_tokens: Maximum number of new tokens to generate per-chunk. If not set,
                 the maximum will be set by the default max_length.
-            chunk_length: The length of audio segments. If it is not None, it will overwrite the
-                default chunk_length of the FeatureExtractor.
+            chunk_length: The length of audio segments. If it is not None, it is used instead
+                of the default chunk_length of the FeatureExtractor.
             clip_timestamps: Optionally provide list of dictionaries each containing "start" and
                 "end" keys that specify the start and end of the voiced region within
                 `chunk_length` boundary. vad_filter will be ignored if clip_timestamps is used.
@@ -368,6 +399,10 @@ class BatchedInferencePipeline:
             hallucination_silence_threshold: Optional[float]
                 When word_timestamps is True, skip silent periods longer than this threshold
                 (in seconds) when a possible hallucination is detected. set as None.
+            fallback_concurrency: Number of temperatures decoded concurrently. Only the first
+                temperature is used in batched mode, so it has no effect.
+            pipelined_encoding: Encode the next window while decoding the current one. Has no
+                effect in batched mode.
         Returns:
           A tuple with:
 
@@ -431,11 +466,8 @@ class BatchedInferencePipeline:
         )
 
         audio_chunks, chunks_metadata = collect_chunks(audio, clip_timestamps)
-        features = (
-            [self.model.feature_extractor(chunk)[..., :-1] for chunk in audio_chunks]
-            if duration_after_vad
-            else []
-        )
+        if not duration_after_vad:
+            audio_chunks, chunks_metadata = [], []
 
         all_language_probs = None
         # detecting the language if not provided
@@ -444,6 +476,18 @@ class BatchedInferencePipeline:
                 language = "en"
                 language_probability = 1
             else:
+                # Only the features of the first chunks are used by the detection.
+                features = []
+                num_frames = 0
+                for chunk in audio_chunks:
+                    if (
+                        num_frames
+                        >= language_detection_segments
+                        * self.model.feature_extractor.nb_max_frames
+                    ):
+                        break
+                    features.append(self.model.feature_extractor(chunk)[..., :-1])
+                    num_frames += features[-1].shape[-1]
                 (
                     language,
                     language_probability,
@@ -475,16 +519,7 @@ class BatchedInferencePipeline:
 
             language_probability = 1
 
-        tokenizer = Tokenizer(
-            self.model.hf_tokenizer,
-            self.model.model.is_multilingual,
-            task=task,
-            language=language,
-        )
-
-        features = (
-            np.stack([pad_or_trim(feature) for feature in features]) if features else []
-        )
+        tokenizer = self.model.get_tokenizer(task=task, language=language)
 
         options = TranscriptionOptions(
             beam_size=beam_size,
@@ -501,17 +536,20 @@ class BatchedInferencePipeline:
                 if isinstance(temperature, (list, tuple))
                 else [temperature]
             ),
+            fallback_concurrency=1,
+            pipelined_encoding=False,
             initial_prompt=initial_prompt,
             prefix=prefix,
             suppress_blank=suppress_blank,
             suppress_tokens=(
-                get_suppressed_tokens(tokenizer, suppress_tokens)
+                tokenizer.get_suppressed_tokens(tuple(suppress_tokens))
                 if suppress_tokens
                 else suppress_tokens
             ),
             prepend_punctuations=prepend_punctuations,
             append_punctuations=append_punctuations,
             max_new_tokens=max_new_tokens,
+            chunk_length=chunk_length,
             hotwords=hotwords,
             word_timestamps=word_timestamps,
             hallucination_silence_threshold=None,
@@ -534,7 +572,7 @@ class BatchedInferencePipeline:
         )
 
         segments = self._batched_segments_generator(
-            features,
+            audio_chunks,
             tokenizer,
             chunks_metadata,
             batch_size,
@@ -544,41 +582,102 @@ class BatchedInferencePipeline:
 
         return segments, info
 
+    def _batch_features(
+        self, audio_chunks: List[np.ndarray], indices: List[int]
+    ) -> np.ndarray:
+        """Computes the padded features of a batch of chunks."""
+        feature_extractor = self.model.feature_extractor
+        features = np.empty(
+            (len(indices), self.model.model.n_mels, 3000), dtype=np.float32
+        )
+        for index, out in zip(indices, features):
+            pad_or_trim(feature_extractor(audio_chunks[index])[..., :-1], out=out)
+        return features
+
     def _batched_segments_generator(
-        self, features, tokenizer, chunks_metadata, batch_size, options, log_progress
+        self,
+        audio_chunks,
+        tokenizer,
+        chunks_metadata,
+        batch_size,
+        options,
+        log_progress,
     ):
-        pbar = tqdm(total=len(features), disable=not log_progress, position=0)
+        pbar = tqdm(total=len(audio_chunks), disable=not log_progress, position=0)
         seg_idx = 0
-        for i in range(0, len(features), batch_size):
-            results = self.forward(
-                features[i : i + batch_size],
-                tokenizer,
-                chunks_metadata[i : i + batch_size],
-                options,
+
+        order = list(range(len(audio_chunks)))
+        if self.sort_by_length and not options.word_timestamps:
+            order.sort(
+                key=lambda i: chunks_metadata[i]["end_time"]
+                - chunks_metadata[i]["start_time"],
+                reverse=True,
             )
 
-            for result in results:
-                for segment in result:
-                    seg_idx += 1
-                    yield Segment(
-                        seek=segment["seek"],
-                        id=seg_idx,
-                        text=segment["text"],
-                        start=round(segment["start"], 3),
-                        end=round(segment["end"], 3),
-                        words=(
-                            None
-                            if not options.word_timestamps
-                            else [Word(**word) for word in segment["words"]]
-                        ),
-                        tokens=segment["tokens"],
-                        avg_logprob=segment["avg_logprob"],
-                        no_speech_prob=segment["no_speech_prob"],
-                        compression_ratio=segment["compression_ratio"],
-                        temperature=options.temperatures[0],
+        batches = [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+        # The features of the next batch are computed in a thread while the current
+        # batch is transcribed, so at most two batches of features are in memory.
+        feature_executor = ThreadPoolExecutor(
+            1, thread_name_prefix="faster_whisper_features"
+        )
+        next_features = (
+            feature_executor.submit(self._batch_features, audio_chunks, batches[0])
+            if batches
+            else None
+        )
+
+        # Results of the chunks transcribed ahead of a previous chunk.
+        pending_results = {}
+        next_chunk = 0
+        try:
+            for batch_index, indices in enumerate(batches):
+                features = next_features.result()
+                next_features = (
+                    feature_executor.submit(
+                        self._batch_features, audio_chunks, batches[batch_index + 1]
                     )
+                    if batch_index + 1 < len(batches)
+                    else None
+                )
+
+                results = self.forward(
+                    features,
+                    tokenizer,
+                    [chunks_metadata[index] for index in indices],
+                    options,
+                )
+                del features
+                pending_results.update(zip(indices, results))
+
+                while next_chunk in pending_results:
+                    result = pending_results.pop(next_chunk)
+                    next_chunk += 1
+                    for segment in result:
+                        seg_idx += 1
+                        yield Segment(
+                            seek=segment["seek"],
+                            id=seg_idx,
+                            text=segment["text"],
+                            start=round(segment["start"], 3),
+                            end=round(segment["end"], 3),
+                            words=(
+                                None
+                                if not options.word_timestamps
+                                else [Word(**word) for word in segment["words"]]
+                            ),
+                            tokens=segment["tokens"],
+                            avg_logprob=segment["avg_logprob"],
+                            no_speech_prob=segment["no_speech_prob"],
+                            compression_ratio=segment["compression_ratio"],
+                            temperature=options.temperatures[0],
+                        )
 
-                pbar.update(1)
+                    pbar.update(1)
+        finally:
+            if next_features is not None:
+                next_features.cancel()
+            feature_executor.shutdown(wait=False)
 
         pbar.close()
         self.last_speech_timestamp = 0.0
@@ -627,6 +726,12 @@ class WhisperModel:
           files: Load model files from the memory. This argument is a dictionary mapping file names
             to file contents as file-like or bytes objects. If this is set, model_path acts as an
             identifier for this model.
+
+        The word timestamps alignments of concurrent transcriptions can be batched by setting
+        the `alignment_scheduler` attribute to an `AlignmentScheduler` for this model.
+
+        A smaller model sharing the encoder of this model (e.g. distil-large-v3 for large-v3)
+        can decode first with `set_draft_model`.
         """
         self.logger = get_logger()
 
@@ -678,12 +783,91 @@ class WhisperModel:
         )
         self.time_precision = 0.02
         self.max_length = 448
+        self._executor = ThreadPoolExecutor(thread_name_prefix="faster_whisper")
+        self.alignment_scheduler: Optional[AlignmentScheduler] = None
+        self.draft_model: Optional[ctranslate2.models.Whisper] = None
+        self.draft_log_prob_threshold = -0.5
+        self._tokenizers: Dict[Tuple[Optional[str], Optional[str]], Tokenizer] = {}
 
     @property
     def supported_languages(self) -> List[str]:
         """The languages supported by the model."""
         return list(_LANGUAGE_CODES) if self.model.is_multilingual else ["en"]
 
+    def set_draft_model(
+        self,
+        draft_model: Optional["WhisperModel"],
+        log_prob_threshold: float = -0.5,
+    ) -> None:
+        """Sets a draft model decoding each window before this model.
+
+        The draft decoder runs on the encoder output of this model, so both models must
+        share the same encoder, e.g. distil-large-v3 for large-v3. The draft result of the
+        first temperature is kept when it passes the fallback thresholds and its average
+        log probability is at least `log_prob_threshold`. Otherwise the window is decoded
+        by this model as usual, after the draft decoding. The outputs can therefore differ
+        from the outputs of this model alone. The `draft_windows` and
+        `draft_accepted_windows` fields of `TranscriptionInfo` report how often the draft
+        result is kept.
+
+        Arguments:
+          draft_model: The draft model, or None to disable the draft decoding.
+          log_prob_threshold: Minimum average log probability of the draft results.
+        """
+        if draft_model is not None:
+            if (
+                draft_model.model.is_multilingual != self.model.is_multilingual
+                or draft_model.model.n_mels != self.model.n_mels
+                or draft_model.hf_tokenizer.get_vocab_size()
+                != self.hf_tokenizer.get_vocab_size()
+            ):
+                raise ValueError(
+                    "The draft model must have the same vocabulary and input features "
+                    "as the model"
+                )
+
+            # Decode a token from an encoder output of this model, which fails when the
+            # encoders have different widths (e.g. medium for large-v2).
+            features = np.zeros(
+                (self.model.n_mels, self.feature_extractor.nb_max_frames),
+                dtype=np.float32,
+            )
+            sot = self.hf_tokenizer.token_to_id("<|startoftranscript|>")
+            try:
+                draft_model.model.generate(self.encode(features), [[sot]], max_length=1)
+            except (RuntimeError, ValueError) as e:
+                raise ValueError(
+                    "The draft model decoder does not accept the encoder output of the "
+                    "model, both models must share the same encoder"
+                ) from e
+
+            self.draft_model = draft_model.model
+        else:
+            self.draft_model = None
+        self.draft_log_prob_threshold = log_prob_threshold
+
+    def get_tokenizer(
+        self, task: str = "transcribe", language: Optional[str] = None
+    ) -> Tokenizer:
+        """Returns the tokenizer for a task and a language.
+
+        The tokenizers are created once per (task, language) pair and shared by all
+        transcriptions, so the tables they compute (e.g. the non-speech tokens) are reused.
+        """
+        key = (task, language) if self.model.is_multilingual else (None, None)
+        tokenizer = self._tokenizers.get(key)
+
+        if tokenizer is None:
+            tokenizer = Tokenizer(
+                self.hf_tokenizer,
+                self.model.is_multilingual,
+                task=task,
+                language=language,
+            )
+            tokenizer = self._tokenizers.setdefault(key, tokenizer)
+
+        return tokenizer
+
     def _get_feature_kwargs(self, model_path, preprocessor_bytes=None) -> dict:
         config = {}
         try:
@@ -746,11 +930,15 @@ class WhisperModel:
         hotwords: Optional[str] = None,
         language_detection_threshold: Optional[float] = 0.5,
         language_detection_segments: int = 1,
+        fallback_concurrency: int = 1,
+        pipelined_encoding: bool = False,
     ) -> Tuple[Iterable[Segment], TranscriptionInfo]:
         """Transcribes an input file.
 
         Arguments:
           audio: Path to the input file (or a file-like object), or the audio waveform.
+            The waveform can be an int16 array or a memory map returned by `open_pcm`,
+            which is read block by block.
           language: The language spoken in the audio. It should be a language code such
             as "en" or "fr". If not set, the language will be detected in the first 30 seconds
             of audio.
@@ -801,8 +989,8 @@ class WhisperModel:
             parameters and default values in the class `VadOptions`).
           max_new_tokens: Maximum number of new tokens to generate per-chunk. If not set,
             the maximum will be set by the default max_length.
-          chunk_length: The length of audio segments. If it is not None, it will overwrite the
-            default chunk_length of the FeatureExtractor.
+          chunk_length: The length of audio segments. If it is not None, it is used instead
+            of the default chunk_length of the FeatureExtractor.
           clip_timestamps:
             Comma-separated list start,end,start,end,... timestamps (in seconds) of clips to
              process. The last end timestamp defaults to the end of the file.
@@ -815,6 +1003,16 @@ class WhisperModel:
           language_detection_threshold: If the maximum probability of the language tokens is higher
            than this value, the language is detected.
           language_detection_segments: Number of segments to consider for the language detection.
+          fallback_concurrency: Number of temperatures that are decoded concurrently. When
+            greater than 1, the next temperatures are decoded speculatively in worker threads
+            together with the current one, and the first result passing the thresholds in
+            temperature order is kept. The model should be loaded with num_workers >= this
+            value for the decodings to actually run in parallel.
+          pipelined_encoding: Encode the next window in a worker thread while the current
+            window is decoded. The speculative encoding is used when seek lands at the end of
+            the current window (e.g. with `without_timestamps`, silent windows or windows
+            ending on a single timestamp) and discarded otherwise. Requires num_workers >= 2
+            for the encoder and decoder to actually overlap.
         Returns:
           A tuple with:
 
@@ -846,9 +1044,12 @@ class WhisperModel:
             elif isinstance(vad_parameters, dict):
                 vad_parameters = VadOptions(**vad_parameters)
             speech_chunks = get_speech_timestamps(audio, vad_parameters)
+            # The chunks are views of the audio: the features are computed from them
+            # without copying the speech audio into a new array.
             audio_chunks, chunks_metadata = collect_chunks(audio, speech_chunks)
-            audio = np.concatenate(audio_chunks, axis=0)
-            duration_after_vad = audio.shape[0] / sampling_rate
+            duration_after_vad = (
+                sum(chunk.shape[0] for chunk in audio_chunks) / sampling_rate
+            )
 
             self.logger.info(
                 "VAD filter removed %s of audio",
@@ -871,7 +1072,11 @@ class WhisperModel:
         else:
             speech_chunks = None
 
-        features = self.feature_extractor(audio, chunk_length=chunk_length)
+        chunk_length = chunk_length or self.feature_extractor.chunk_length
+        if speech_chunks is not None:
+            features = self.feature_extractor.concatenated(audio_chunks)
+        else:
+            features = self.feature_extractor(audio)
 
         encoder_output = None
         all_language_probs = None
@@ -901,6 +1106,7 @@ class WhisperModel:
                     features=features[..., seek:],
                     language_detection_segments=language_detection_segments,
                     language_detection_threshold=language_detection_threshold,
+                    chunk_length=chunk_length,
                 )
 
                 self.logger.info(
@@ -918,12 +1124,7 @@ class WhisperModel:
 
             language_probability = 1
 
-        tokenizer = Tokenizer(
-            self.hf_tokenizer,
-            self.model.is_multilingual,
-            task=task,
-            language=language,
-        )
+        tokenizer = self.get_tokenizer(task=task, language=language)
 
         options = TranscriptionOptions(
             beam_size=beam_size,
@@ -940,11 +1141,13 @@ class WhisperModel:
             temperatures=(
                 temperature if isinstance(temperature, (list, tuple)) else [temperature]
             ),
+            fallback_concurrency=fallback_concurrency,
+            pipelined_encoding=pipelined_encoding,
             initial_prompt=initial_prompt,
             prefix=prefix,
             suppress_blank=suppress_blank,
             suppress_tokens=(
-                get_suppressed_tokens(tokenizer, suppress_tokens)
+                tokenizer.get_suppressed_tokens(tuple(suppress_tokens))
                 if suppress_tokens
                 else suppress_tokens
             ),
@@ -955,18 +1158,12 @@ class WhisperModel:
             append_punctuations=append_punctuations,
             multilingual=multilingual,
             max_new_tokens=max_new_tokens,
+            chunk_length=chunk_length,
             clip_timestamps=clip_timestamps,
             hallucination_silence_threshold=hallucination_silence_threshold,
             hotwords=hotwords,
         )
 
-        segments = self.generate_segments(
-            features, tokenizer, options, log_progress, encoder_output
-        )
-
-        if speech_chunks:
-            segments = restore_speech_timestamps(segments, speech_chunks, sampling_rate)
-
         info = TranscriptionInfo(
             language=language,
             language_probability=language_probability,
@@ -977,6 +1174,13 @@ class WhisperModel:
             all_language_probs=all_language_probs,
         )
 
+        segments = self.generate_segments(
+            features, tokenizer, options, log_progress, encoder_output, info
+        )
+
+        if speech_chunks:
+            segments = restore_speech_timestamps(segments, speech_chunks, sampling_rate)
+
         return segments, info
 
     def _split_segments_by_timestamps(
@@ -1065,9 +1269,11 @@ class WhisperModel:
         options: TranscriptionOptions,
         log_progress,
         encoder_output: Optional[ctranslate2.StorageView] = None,
+        info: Optional[TranscriptionInfo] = None,
     ) -> Iterable[Segment]:
         content_frames = features.shape[-1] - 1
         content_duration = float(content_frames * self.feature_extractor.time_per_frame)
+        nb_max_frames = self.feature_extractor.get_nb_max_frames(options.chunk_length)
 
         if isinstance(options.clip_timestamps, str):
             options.clip_timestamps = [
@@ -1101,13 +1307,18 @@ class WhisperModel:
         if options.initial_prompt is not None:
             if isinstance(options.initial_prompt, str):
                 initial_prompt = " " + options.initial_prompt.strip()
-                initial_prompt_tokens = tokenizer.encode(initial_prompt)
+                initial_prompt_tokens = tokenizer.encode_prompt(initial_prompt)
                 all_tokens.extend(initial_prompt_tokens)
             else:
                 all_tokens.extend(options.initial_prompt)
 
         pbar = tqdm(total=content_duration, unit="seconds", disable=not log_progress)
         last_speech_timestamp = 0.0
+        # The windows are padded into this buffer, which is reused since the encoding
+        # does not keep a reference to its input.
+        segment_buffer = np.empty((features.shape[0], 3000), dtype=features.dtype)
+        # (clip index, seek, future) of the window encoded ahead in pipelined mode.
+        next_encoding = None
         # NOTE: This loop is obscurely flattened to make the diff readable.
         # A later commit should turn this into a simpler nested loop.
         # for seek_clip_start, seek_clip_end in seek_clips:
@@ -1125,17 +1336,14 @@ class WhisperModel:
                 continue
             time_offset = seek * self.feature_extractor.time_per_frame
             window_end_time = float(
-                (seek + self.feature_extractor.nb_max_frames)
-                * self.feature_extractor.time_per_frame
+                (seek + nb_max_frames) * self.feature_extractor.time_per_frame
             )
             segment_size = min(
-                self.feature_extractor.nb_max_frames,
+                nb_max_frames,
                 content_frames - seek,
                 seek_clip_end - seek,
             )
-            segment = features[:, seek : seek + segment_size]
             segment_duration = segment_size * self.feature_extractor.time_per_frame
-            segment = pad_or_trim(segment)
 
             if self.logger.isEnabledFor(logging.DEBUG):
                 self.logger.debug(
@@ -1144,16 +1352,43 @@ class WhisperModel:
 
             previous_tokens = all_tokens[prompt_reset_since:]
 
-            if seek > 0 or encoder_output is None:
-                encoder_output = self.encode(segment)
+            if next_encoding is not None and next_encoding[:2] == (clip_idx, seek):
+                encoder_output = next_encoding[2].result()
+            elif seek > 0 or encoder_output is None:
+                if next_encoding is not None:
+                    # The decoded timestamps moved seek elsewhere, drop the speculation.
+                    next_encoding[2].cancel()
+                encoder_output = self.encode(
+                    pad_or_trim(
+                        features[:, seek : seek + segment_size], out=segment_buffer
+                    )
+                )
+            next_encoding = None
+
+            next_seek = seek + segment_size
+            if options.pipelined_encoding and next_seek < seek_clip_end:
+                # Encode the window following this one while the current window is
+                # decoded. It is used if seek ends up at the end of the current window.
+                next_segment = features[
+                    :,
+                    next_seek : next_seek
+                    + min(nb_max_frames, seek_clip_end - next_seek),
+                ]
+                next_encoding = (
+                    clip_idx,
+                    next_seek,
+                    self._executor.submit(self.encode, pad_or_trim(next_segment)),
+                )
 
             if options.multilingual:
                 results = self.model.detect_language(encoder_output)
                 language_token, language_probability = results[0][0]
                 language = language_token[2:-2]
 
-                tokenizer.language = tokenizer.tokenizer.token_to_id(language_token)
-                tokenizer.language_code = language
+                # The tokenizers are shared: switch to the one of the detected language
+                # instead of updating this one.
+                task_token = tokenizer.tokenizer.id_to_token(tokenizer.task)
+                tokenizer = self.get_tokenizer(task=task_token[2:-2], language=language)
 
             prompt = self.get_prompt(
                 tokenizer,
@@ -1168,7 +1403,9 @@ class WhisperModel:
                 avg_logprob,
                 temperature,
                 compression_ratio,
-            ) = self.generate_with_fallback(encoder_output, prompt, tokenizer, options)
+            ) = self.generate_with_fallback(
+                encoder_output, prompt, tokenizer, options, info
+            )
 
             if options.no_speech_threshold is not None:
                 # no voice activity check
@@ -1344,8 +1581,18 @@ class WhisperModel:
                 (min(content_frames, seek) - previous_seek)
                 * self.feature_extractor.time_per_frame,
             )
+
+        if next_encoding is not None:
+            next_encoding[2].cancel()
         pbar.close()
 
+        if info is not None and info.draft_windows:
+            self.logger.info(
+                "Draft model results kept for %d of %d windows",
+                info.draft_accepted_windows,
+                info.draft_windows,
+            )
+
     def encode(self, features: np.ndarray) -> ctranslate2.StorageView:
         # When the model is running on multiple GPUs, the encoder output should be moved
         # to the CPU since we don't know which GPU will handle the next job.
@@ -1363,8 +1610,8 @@ class WhisperModel:
         prompt: List[int],
         tokenizer: Tokenizer,
         options: TranscriptionOptions,
+        info: Optional[TranscriptionInfo] = None,
     ) -> Tuple[ctranslate2.models.WhisperGenerationResult, float, float, float]:
-        decode_result = None
         all_results = []
         below_cr_threshold_results = []
 
@@ -1387,105 +1634,178 @@ class WhisperModel:
                 f"so that their combined length is less that {self.max_length}."
             )
 
-        for temperature in options.temperatures:
-            if temperature > 0:
-                kwargs = {
-                    "beam_size": 1,
-                    "num_hypotheses": options.best_of,
-                    "sampling_topk": 0,
-                    "sampling_temperature": temperature,
-                }
+        def decode(temperature: float, model: ctranslate2.models.Whisper = self.model):
+            return self._decode_with_temperature(
+                encoder_output,
+                prompt,
+                tokenizer,
+                options,
+                temperature,
+                max_length,
+                max_initial_timestamp_index,
+                model,
+            )
+
+        temperatures = options.temperatures
+
+        if self.draft_model is not None:
+            decode_result = decode(temperatures[0], self.draft_model)
+            needs_fallback, _ = self._needs_fallback(decode_result, options)
+            accepted = (
+                not needs_fallback and decode_result[1] >= self.draft_log_prob_threshold
+            )
+            if info is not None:
+                info.draft_windows += 1
+                info.draft_accepted_windows += accepted
+            if accepted:
+                return decode_result
+
+        concurrency = max(1, options.fallback_concurrency)
+
+        for i in range(0, len(temperatures), concurrency):
+            candidate_temperatures = temperatures[i : i + concurrency]
+
+            if len(candidate_temperatures) > 1:
+                # Speculatively decode the next temperatures in parallel. The results are
+                # still checked in temperature order below.
+                decode_results = list(
+                    self._executor.map(decode, candidate_temperatures)
+                )
             else:
-                kwargs = {
-                    "beam_size": options.beam_size,
-                    "patience": options.patience,
-                }
+                decode_results = [decode(candidate_temperatures[0])]
 
-            result = self.model.generate(
-                encoder_output,
-                [prompt],
-                length_penalty=options.length_penalty,
-                repetition_penalty=options.repetition_penalty,
-                no_repeat_ngram_size=options.no_repeat_ngram_size,
-                max_length=max_length,
-                return_scores=True,
-                return_no_speech_prob=True,
-                suppress_blank=options.suppress_blank,
-                suppress_tokens=options.suppress_tokens,
-                max_initial_timestamp_index=max_initial_timestamp_index,
-                **kwargs,
-            )[0]
+            for decode_result in decode_results:
+                all_results.append(decode_result)
+                needs_fallback, below_cr_threshold = self._needs_fallback(
+                    decode_result, options
+                )
 
-            tokens = result.sequences_ids[0]
+                if below_cr_threshold:
+                    below_cr_threshold_results.append(decode_result)
+                if not needs_fallback:
+                    return decode_result
 
-            # Recover the average log prob from the returned score.
-            seq_len = len(tokens)
-            cum_logprob = result.scores[0] * (seq_len**options.length_penalty)
-            avg_logprob = cum_logprob / (seq_len + 1)
+        # all failed, select the result with the highest average log probability
+        decode_result = max(
+            below_cr_threshold_results or all_results, key=lambda x: x[1]
+        )
+        # to pass final temperature for prompt_reset_on_temperature
+        decode_result = (
+            decode_result[0],
+            decode_result[1],
+            temperatures[-1],
+            decode_result[3],
+        )
 
-            text = tokenizer.decode(tokens).strip()
-            compression_ratio = get_compression_ratio(text)
+        return decode_result
 
-            decode_result = (
-                result,
-                avg_logprob,
-                temperature,
-                compression_ratio,
-            )
-            all_results.append(decode_result)
+    def _decode_with_temperature(
+        self,
+        encoder_output: ctranslate2.StorageView,
+        prompt: List[int],
+        tokenizer: Tokenizer,
+        options: TranscriptionOptions,
+        temperature: float,
+        max_length: int,
+        max_initial_timestamp_index: int,
+        model: Optional[ctranslate2.models.Whisper] = None,
+    ) -> Tuple[ctranslate2.models.WhisperGenerationResult, float, float, float]:
+        if model is None:
+            model = self.model
+
+        if temperature > 0:
+            kwargs = {
+                "beam_size": 1,
+                "num_hypotheses": options.best_of,
+                "sampling_topk": 0,
+                "sampling_temperature": temperature,
+            }
+        else:
+            kwargs = {
+                "beam_size": options.beam_size,
+                "patience": options.patience,
+            }
 
-            needs_fallback = False
+        result = model.generate(
+            encoder_output,
+            [prompt],
+            length_penalty=options.length_penalty,
+            repetition_penalty=options.repetition_penalty,
+            no_repeat_ngram_size=options.no_repeat_ngram_size,
+            max_length=max_length,
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=options.suppress_blank,
+            suppress_tokens=options.suppress_tokens,
+            max_initial_timestamp_index=max_initial_timestamp_index,
+            **kwargs,
+        )[0]
 
-            if options.compression_ratio_threshold is not None:
-                if compression_ratio > options.compression_ratio_threshold:
-                    needs_fallback = True  # too repetitive
+        tokens = result.sequences_ids[0]
 
-                    self.logger.debug(
-                        "Compression ratio threshold is not met with temperature %.1f (%f > %f)",
-                        temperature,
-                        compression_ratio,
-                        options.compression_ratio_threshold,
-                    )
-                else:
-                    below_cr_threshold_results.append(decode_result)
+        # Recover the average log prob from the returned score.
+        seq_len = len(tokens)
+        cum_logprob = result.scores[0] * (seq_len**options.length_penalty)
+        avg_logprob = cum_logprob / (seq_len + 1)
 
-            if (
-                options.log_prob_threshold is not None
-                and avg_logprob < options.log_prob_threshold
-            ):
-                needs_fallback = True  # average log probability is too low
+        text = tokenizer.decode(tokens).strip()
+        compression_ratio = get_compression_ratio(text)
+
+        return (
+            result,
+            avg_logprob,
+            temperature,
+            compression_ratio,
+        )
+
+    def _needs_fallback(
+        self,
+        decode_result: Tuple[
+            ctranslate2.models.WhisperGenerationResult, float, float, float
+        ],
+        options: TranscriptionOptions,
+    ) -> Tuple[bool, bool]:
+        """Returns whether the decoding failed and whether the result is below the
+        compression ratio threshold."""
+        result, avg_logprob, temperature, compression_ratio = decode_result
+        needs_fallback = False
+        below_cr_threshold = False
+
+        if options.compression_ratio_threshold is not None:
+            if compression_ratio > options.compression_ratio_threshold:
+                needs_fallback = True  # too repetitive
 
                 self.logger.debug(
-                    "Log probability threshold is not met with temperature %.1f (%f < %f)",
+                    "Compression ratio threshold is not met with temperature %.1f (%f > %f)",
                     temperature,
-                    avg_logprob,
-                    options.log_prob_threshold,
+                    compression_ratio,
+                    options.compression_ratio_threshold,
                 )
+            else:
+                below_cr_threshold = True
 
-            if (
-                options.no_speech_threshold is not None
-                and result.no_speech_prob > options.no_speech_threshold
-                and options.log_prob_threshold is not None
-                and avg_logprob < options.log_prob_threshold
-            ):
-                needs_fallback = False  # silence
+        if (
+            options.log_prob_threshold is not None
+            and avg_logprob < options.log_prob_threshold
+        ):
+            needs_fallback = True  # average log probability is too low
 
-            if not needs_fallback:
-                break
-        else:
-            # all failed, select the result with the highest average log probability
-            decode_result = max(
-                below_cr_threshold_results or all_results, key=lambda x: x[1]
-            )
-            # to pass final temperature for prompt_reset_on_temperature
-            decode_result = (
-                decode_result[0],
-                decode_result[1],
+            self.logger.debug(
+                "Log probability threshold is not met with temperature %.1f (%f < %f)",
                 temperature,
-                decode_result[3],
+                avg_logprob,
+                options.log_prob_threshold,
             )
 
-        return decode_result
+        if (
+            options.no_speech_threshold is not None
+            and result.no_speech_prob > options.no_speech_threshold
+            and options.log_prob_threshold is not None
+            and avg_logprob < options.log_prob_threshold
+        ):
+            needs_fallback = False  # silence
+
+        return needs_fallback, below_cr_threshold
 
     def get_prompt(
         self,
@@ -1500,7 +1820,7 @@ class WhisperModel:
         if previous_tokens or (hotwords and not prefix):
             prompt.append(tokenizer.sot_prev)
             if hotwords and not prefix:
-                hotwords_tokens = tokenizer.encode(" " + hotwords.strip())
+                hotwords_tokens = tokenizer.encode_prompt(" " + hotwords.strip())
                 if len(hotwords_tokens) >= self.max_length // 2:
                     hotwords_tokens = hotwords_tokens[: self.max_length // 2 - 1]
                 prompt.extend(hotwords_tokens)
@@ -1513,7 +1833,7 @@ class WhisperModel:
             prompt.append(tokenizer.no_timestamps)
 
         if prefix:
-            prefix_tokens = tokenizer.encode(" " + prefix.strip())
+            prefix_tokens = tokenizer.encode_prompt(" " + prefix.strip())
             if len(prefix_tokens) >= self.max_length // 2:
                 prefix_tokens = prefix_tokens[: self.max_length // 2 - 1]
             if not without_timestamps:
@@ -1664,7 +1984,8 @@ class WhisperModel:
         if len(text_tokens) == 0:
             return []
 
-        results = self.model.align(
+        aligner = self.alignment_scheduler or self.model
+        results = aligner.align(
             encoder_output,
             tokenizer.sot_sequence,
             text_tokens,
@@ -1731,6 +2052,7 @@ class WhisperModel:
         vad_parameters: Union[dict, VadOptions] = None,
         language_detection_segments: int = 1,
         language_detection_threshold: float = 0.5,
+        chunk_length: Optional[int] = None,
     ) -> Tuple[str, float, List[Tuple[str, float]]]:
         """
         Use Whisper to detect the language of the input audio or features.
@@ -1747,6 +2069,8 @@ class WhisperModel:
             language_detection_threshold: If the maximum probability of the language tokens is
                 higher than this value, the language is detected.
             language_detection_segments: Number of segments to consider for the language detection.
+            chunk_length: The length of the segments in seconds. Defaults to the chunk length of
+                the feature extractor.
 
         Returns:
             language: Detected language.
@@ -1757,46 +2081,166 @@ class WhisperModel:
             audio is not None or features is not None
         ), "Either `audio` or `features` must be provided."
 
-        if audio is not None:
-            if vad_filter:
-                speech_chunks = get_speech_timestamps(audio, vad_parameters)
-                audio_chunks, chunks_metadata = collect_chunks(audio, speech_chunks)
-                audio = np.concatenate(audio_chunks, axis=0)
+        return self.detect_language_batch(
+            audios=[audio] if audio is not None else None,
+            features=[features] if audio is None else None,
+            vad_filter=vad_filter,
+            vad_parameters=vad_parameters,
+            language_detection_segments=language_detection_segments,
+            language_detection_threshold=language_detection_threshold,
+            chunk_length=chunk_length,
+            batch_size=1,
+        )[0]
+
+    def detect_language_batch(
+        self,
+        audios: Optional[Iterable[np.ndarray]] = None,
+        features: Optional[Iterable[np.ndarray]] = None,
+        vad_filter: bool = False,
+        vad_parameters: Union[dict, VadOptions] = None,
+        language_detection_segments: int = 1,
+        language_detection_threshold: float = 0.5,
+        chunk_length: Optional[int] = None,
+        batch_size: int = 16,
+    ) -> List[Tuple[str, float, List[Tuple[str, float]]]]:
+        """
+        Use Whisper to detect the language of many audio clips or features.
 
-            audio = audio[
-                : language_detection_segments * self.feature_extractor.n_samples
-            ]
-            features = self.feature_extractor(audio)
+        The windows of up to `batch_size` inputs are encoded and scored together. An input
+        leaves the batch as soon as one of its windows is above the threshold and the next
+        input takes its place, so the result of each input is the same as with
+        `detect_language`. The inputs can be a generator: they are only read when a
+        place is free in the batch.
 
-        features = features[
-            ..., : language_detection_segments * self.feature_extractor.nb_max_frames
-        ]
+        Arguments:
+            audios: Input audio signals, 1D float arrays sampled at 16khz.
+            features: Input Mel spectrogram features, float arrays with shape
+                (n_mels, n_frames), if `audios` is provided, the features will be ignored.
+                Either `audios` or `features` must be provided.
+            vad_filter: Enable the voice activity detection (VAD) to filter out parts of the audio
+                without speech. This step is using the Silero VAD model.
+            vad_parameters: Dictionary of Silero VAD parameters or VadOptions class (see available
+                parameters and default values in the class `VadOptions`).
+            language_detection_segments: Number of segments to consider for the language detection.
+            language_detection_threshold: If the maximum probability of the language tokens is
+                higher than this value, the language is detected.
+            chunk_length: The length of the segments in seconds. Defaults to the chunk length of
+                the feature extractor.
+            batch_size: Number of windows encoded at once.
 
-        detected_language_info = {}
-        for i in range(0, features.shape[-1], self.feature_extractor.nb_max_frames):
-            encoder_output = self.encode(
-                pad_or_trim(features[..., i : i + self.feature_extractor.nb_max_frames])
+        Returns:
+            A list with a tuple (language, language_probability, all_language_probs) per
+            input, in the order of the inputs.
+        """
+        assert (
+            audios is not None or features is not None
+        ), "Either `audios` or `features` must be provided."
+
+        if isinstance(vad_parameters, dict):
+            vad_parameters = VadOptions(**vad_parameters)
+
+        nb_max_frames = self.feature_extractor.get_nb_max_frames(chunk_length)
+        if audios is not None:
+            inputs = (
+                self._language_detection_features(
+                    audio,
+                    vad_filter,
+                    vad_parameters,
+                    language_detection_segments,
+                    chunk_length,
+                )
+                for audio in audios
             )
-            # results is a list of tuple[str, float] with language names and probabilities.
-            results = self.model.detect_language(encoder_output)[0]
-
-            # Parse language names to strip out markers
-            all_language_probs = [(token[2:-2], prob) for (token, prob) in results]
-            # Get top language token and probability
-            language, language_probability = all_language_probs[0]
-            if language_probability > language_detection_threshold:
-                break
-            detected_language_info.setdefault(language, []).append(language_probability)
         else:
-            # If no language detected for all segments, the majority vote of the highest
-            # projected languages for all segments is used to determine the language.
-            language = max(
-                detected_language_info,
-                key=lambda lang: len(detected_language_info[lang]),
+            inputs = (
+                input_features[..., : language_detection_segments * nb_max_frames]
+                for input_features in features
             )
-            language_probability = max(detected_language_info[language])
+        inputs = enumerate(inputs)
+
+        results = {}
+        # (input index, features, language probabilities of the windows scored so far)
+        active = []
+        while True:
+            while len(active) < batch_size:
+                item = next(inputs, None)
+                if item is None:
+                    break
+                active.append((*item, []))
+            if not active:
+                break
+
+            windows = np.empty((len(active), self.model.n_mels, 3000), dtype=np.float32)
+            for (_, input_features, window_probs), out in zip(active, windows):
+                start = len(window_probs) * nb_max_frames
+                pad_or_trim(input_features[..., start : start + nb_max_frames], out=out)
 
-        return language, language_probability, all_language_probs
+            encoder_output = self.encode(windows)
+            # results is a list of tuple[str, float] with language names and probabilities.
+            batch_results = self.model.detect_language(encoder_output)
+
+            still_active = []
+            for item, window_results in zip(active, batch_results):
+                index, input_features, window_probs = item
+                # Parse language names to strip out markers
+                window_probs.append(
+                    [(token[2:-2], prob) for (token, prob) in window_results]
+                )
+                if (
+                    window_probs[-1][0][1] > language_detection_threshold
+                    or len(window_probs) * nb_max_frames >= input_features.shape[-1]
+                ):
+                    results[index] = _select_language(
+                        window_probs, language_detection_threshold
+                    )
+                else:
+                    still_active.append(item)
+            active = still_active
+
+        return [results[index] for index in range(len(results))]
+
+    def _language_detection_features(
+        self,
+        audio: np.ndarray,
+        vad_filter: bool,
+        vad_parameters: Optional[VadOptions],
+        language_detection_segments: int,
+        chunk_length: Optional[int],
+    ) -> np.ndarray:
+        if vad_filter:
+            speech_chunks = get_speech_timestamps(audio, vad_parameters)
+            audio_chunks, chunks_metadata = collect_chunks(audio, speech_chunks)
+            audio = np.concatenate(audio_chunks, axis=0)
+
+        audio = audio[
+            : language_detection_segments
+            * self.feature_extractor.get_num_samples(chunk_length)
+        ]
+        return self.feature_extractor(audio)
+
+
+def _select_language(
+    window_probs: List[List[Tuple[str, float]]], language_detection_threshold: float
+) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """Returns the language of the first window above the threshold, or the majority
+    vote of the highest projected languages of all the windows."""
+    detected_language_info = {}
+    for all_language_probs in window_probs:
+        # Get top language token and probability
+        language, language_probability = all_language_probs[0]
+        if language_probability > language_detection_threshold:
+            break
+        detected_language_info.setdefault(language, []).append(language_probability)
+    else:
+        # If no language detected for all segments, the majority vote of the highest
+        # projected languages for all segments is used to determine the language.
+        language = max(
+            detected_language_info,
+            key=lambda lang: len(detected_language_info[lang]),
+        )
+        language_probability = max(detected_language_info[language])
+
+    return language, language_probability, all_language_probs
 
 
 def restore_speech_timestamps(
@@ -1841,27 +2285,9 @@ def get_compression_ratio(text: str) -> float:
 
 def get_suppressed_tokens(
     tokenizer: Tokenizer,
-    suppress_tokens: Tuple[int],
-) -> Optional[List[int]]:
-    if -1 in suppress_tokens:
-        suppress_tokens = [t for t in suppress_tokens if t >= 0]
-        suppress_tokens.extend(tokenizer.non_speech_tokens)
-    elif suppress_tokens is None or len(suppress_tokens) == 0:
-        suppress_tokens = []  # interpret empty string as an empty list
-    else:
-        assert isinstance(suppress_tokens, list), "suppress_tokens must be a list"
-
-    suppress_tokens.extend(
-        [
-            tokenizer.transcribe,
-            tokenizer.translate,
-            tokenizer.sot,
-            tokenizer.sot_prev,
-            tokenizer.sot_lm,
-        ]
-    )
-
-    return tuple(sorted(set(suppress_tokens)))
+    suppress_tokens: Optional[List[int]],
+) -> Tuple[int, ...]:
+    return tokenizer.get_suppressed_tokens(tuple(suppress_tokens or ()))
 
 
 def merge_punctuations(alignment: List[dict], prepended: str, appended: str) -> None:
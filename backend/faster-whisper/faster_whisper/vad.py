@@ -7,6 +7,7 @@ from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
+from faster_whisper.audio import to_float32
 from faster_whisper.utils import get_assets_path
 
 
@@ -51,7 +52,8 @@ def get_speech_timestamps(
     """This method is used for splitting long audios into speech chunks using silero VAD.
 
     Args:
-      audio: One dimensional float array.
+      audio: One dimensional float array, or int16 array such as a memory map
+        returned by `open_pcm`.
       vad_options: Options for VAD processing.
       sampling rate: Sampling rate of the audio.
       kwargs: VAD options passed as keyword arguments for backward compatibility.
@@ -83,10 +85,7 @@ def get_speech_timestamps(
 
     model = get_vad_model()
 
-    padded_audio = np.pad(
-        audio, (0, window_size_samples - audio.shape[0] % window_size_samples)
-    )
-    speech_probs = model(padded_audio.reshape(1, -1)).squeeze(0)
+    speech_probs = model.speech_probs(audio, window_size_samples)
 
     triggered = False
     speeches = []
@@ -297,9 +296,60 @@ class SileroVADModel:
         )
 
         batched_audio = audio.reshape(batch_size, -1, num_samples)
-        context = batched_audio[..., -context_size_samples:]
-        context[:, -1] = 0
-        context = np.roll(context, 1, 1)
+        batched_audio[:, -1, -context_size_samples:] = 0
+
+        out, _ = self._run(batched_audio, state, context)
+        return out
+
+    def speech_probs(
+        self,
+        audio: np.ndarray,
+        num_samples: int = 512,
+        context_size_samples: int = 64,
+        block_size: int = 10000,
+    ) -> np.ndarray:
+        """Returns the speech probabilities of a 1D audio padded to a multiple of
+        `num_samples`, like `__call__` on the padded audio.
+
+        The audio is converted to float32 by blocks of `block_size` windows, so that
+        a memory map is read block by block and a long audio is never copied whole.
+        """
+        num_windows = audio.shape[0] // num_samples + 1
+
+        state = np.zeros((2, 1, 128), dtype="float32")
+        context = np.zeros((1, context_size_samples), dtype="float32")
+
+        probs = []
+        for start in range(0, num_windows, block_size):
+            end = min(start + block_size, num_windows)
+            block = to_float32(audio[start * num_samples : end * num_samples])
+            block = np.pad(block, (0, (end - start) * num_samples - block.shape[0]))
+
+            batched_audio = block.reshape(1, -1, num_samples)
+            if end == num_windows:
+                batched_audio[:, -1, -context_size_samples:] = 0
+
+            out, state = self._run(batched_audio, state, context)
+            context = batched_audio[:, -1, -context_size_samples:]
+            probs.append(out)
+
+        return np.concatenate(probs, axis=1).squeeze(0)
+
+    def _run(
+        self, batched_audio: np.ndarray, state: np.ndarray, context: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Runs the model on windows of shape (batch_size, num_windows, num_samples),
+        from the decoder state and the context samples preceding the first window."""
+        batch_size, _, num_samples = batched_audio.shape
+        context_size_samples = context.shape[-1]
+
+        context = np.concatenate(
+            [
+                context[:, None],
+                batched_audio[:, :-1, -context_size_samples:],
+            ],
+            axis=1,
+        )
         batched_audio = np.concatenate([context, batched_audio], 2)
 
         batched_audio = batched_audio.reshape(-1, num_samples + context_size_samples)
@@ -324,7 +374,7 @@ class SileroVADModel:
             decoder_outputs.append(out)
 
         out = np.stack(decoder_outputs, axis=1).squeeze(-1)
-        return out
+        return out, state
 
 
 def merge_segments(segments_list, vad_options: VadOptions, sampling_rate: int = 16000):
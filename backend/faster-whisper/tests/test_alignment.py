@@ -0,0 +1,127 @@
+import threading
+
+import ctranslate2
+import numpy as np
+import pytest
+
+from faster_whisper.alignment import AlignmentScheduler
+
+
+class FakeWhisper:
+    def __init__(self):
+        self.calls = []
+        self.dtypes = []
+
+    def align(self, features, start_sequence, text_tokens, num_frames, **kwargs):
+        self.dtypes.append(features.dtype)
+        features = np.asarray(features.to(ctranslate2.DataType.float32))
+        self.calls.append(len(text_tokens))
+        return [
+            (float(feature[0, 0]), tokens, frames)
+            for feature, tokens, frames in zip(features, text_tokens, num_frames)
+        ]
+
+
+def test_alignment_scheduler_batches_requests():
+    model = FakeWhisper()
+    scheduler = AlignmentScheduler(model, max_batch_size=8, max_wait_time=0.5)
+    results = {}
+
+    def align(i):
+        features = ctranslate2.StorageView.from_array(
+            np.full((1, 4, 8), i, dtype=np.float32)
+        )
+        results[i] = scheduler.align(features, [1, 2, 3], [[i, i + 1]], 100 + i)
+
+    threads = [threading.Thread(target=align, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.close()
+
+    assert sum(model.calls) == 8
+    assert len(model.calls) < 8
+    for i in range(8):
+        assert results[i] == [(float(i), [i, i + 1], 100 + i)]
+
+
+def test_alignment_scheduler_groups_start_sequences():
+    model = FakeWhisper()
+    scheduler = AlignmentScheduler(model, max_batch_size=4, max_wait_time=0.5)
+    results = {}
+
+    def align(i):
+        features = ctranslate2.StorageView.from_array(
+            np.full((2, 4, 8), i, dtype=np.float32)
+        )
+        results[i] = scheduler.align(features, [1, i % 2], [[i], [i, i]], [10, 20])
+
+    threads = [threading.Thread(target=align, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.close()
+
+    assert sum(model.calls) == 8
+    for i in range(4):
+        assert results[i] == [(float(i), [i], 10), (float(i), [i, i], 20)]
+
+
+def test_alignment_scheduler_groups_bfloat16_features():
+    model = FakeWhisper()
+    scheduler = AlignmentScheduler(model, max_batch_size=4, max_wait_time=0.5)
+    results = {}
+
+    def align(i):
+        features = ctranslate2.StorageView.from_array(
+            np.full((1, 4, 8), i, dtype=np.float32)
+        ).to(ctranslate2.DataType.bfloat16)
+        results[i] = scheduler.align(features, [1], [[i]], 10)
+
+    threads = [threading.Thread(target=align, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.close()
+
+    assert sum(model.calls) == 4
+    assert len(model.calls) < 4
+    assert set(model.dtypes) == {ctranslate2.DataType.bfloat16}
+    for i in range(4):
+        assert results[i] == [(float(i), [i], 10)]
+
+
+def test_alignment_scheduler_respects_max_batch_size():
+    model = FakeWhisper()
+    scheduler = AlignmentScheduler(model, max_batch_size=4, max_wait_time=0.5)
+    results = {}
+
+    def align(i):
+        features = ctranslate2.StorageView.from_array(
+            np.full((3, 4, 8), i, dtype=np.float32)
+        )
+        results[i] = scheduler.align(features, [1], [[i]] * 3, [10] * 3)
+
+    threads = [threading.Thread(target=align, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.close()
+
+    assert model.calls == [3, 3, 3, 3]
+    for i in range(4):
+        assert results[i] == [(float(i), [i], 10)] * 3
+
+
+def test_alignment_scheduler_rejects_requests_after_close():
+    scheduler = AlignmentScheduler(FakeWhisper())
+    scheduler.close()
+    scheduler.close()
+
+    features = ctranslate2.StorageView.from_array(np.zeros((1, 4, 8), np.float32))
+    with pytest.raises(RuntimeError, match="closed"):
+        scheduler.align(features, [1, 2, 3], [[1]], 10)
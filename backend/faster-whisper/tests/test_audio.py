@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+from faster_whisper import decode_audio, decode_audio_blocks
+from faster_whisper.audio import pad_or_trim
+from faster_whisper.vad import get_vad_model
+
+
+def test_decode_audio_blocks(data_dir):
+    audio_path = os.path.join(data_dir, "jfk.flac")
+    audio = decode_audio(audio_path)
+
+    assert audio.dtype == np.float32
+    assert audio.shape == (176000,)
+
+    blocks = list(decode_audio_blocks(audio_path, gc_collect=False))
+    np.testing.assert_array_equal(np.concatenate(blocks), audio)
+
+
+def test_decode_audio_blocks_split_stereo(data_dir):
+    audio_path = os.path.join(data_dir, "stereo_diarization.wav")
+    left, right = decode_audio(audio_path, split_stereo=True)
+
+    blocks = list(decode_audio_blocks(audio_path, split_stereo=True))
+    np.testing.assert_array_equal(np.concatenate([b[0] for b in blocks]), left)
+    np.testing.assert_array_equal(np.concatenate([b[1] for b in blocks]), right)
+
+
+def test_vad_speech_probs_by_blocks(data_dir):
+    audio = decode_audio(os.path.join(data_dir, "jfk.flac"))
+    model = get_vad_model()
+
+    padded_audio = np.pad(audio, (0, 512 - audio.shape[0] % 512))
+    expected = model(padded_audio.reshape(1, -1)).squeeze(0)
+
+    speech_probs = model.speech_probs(audio, block_size=100)
+    np.testing.assert_array_equal(speech_probs, expected)
+
+
+def test_pad_or_trim_out():
+    out = np.full((2, 5), np.nan, dtype=np.float32)
+    features = np.arange(6, dtype=np.float32).reshape(2, 3)
+
+    assert pad_or_trim(features, 5, out=out) is out
+    np.testing.assert_array_equal(out, pad_or_trim(features, 5))
+
+    features = np.arange(14, dtype=np.float32).reshape(2, 7)
+    pad_or_trim(features, 5, out=out)
+    np.testing.assert_array_equal(out, features[:, :5])
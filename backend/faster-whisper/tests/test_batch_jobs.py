@@ -0,0 +1,162 @@
+import json
+import os
+import shutil
+import types
+
+import pytest
+
+from faster_whisper import BatchedInferencePipeline
+from faster_whisper.batch_jobs import (
+    BatchTranscriptionRunner,
+    prepare_audio,
+    read_completed_paths,
+    read_manifest,
+    write_srt,
+)
+from faster_whisper.feature_extractor import FeatureExtractor
+from faster_whisper.vad import VadOptions
+
+
+def test_read_manifest(tmpdir):
+    manifest_path = tmpdir.join("manifest.txt")
+    manifest_path.write("# driver queries\nfirst.wav\n\n/data/second.flac\n")
+
+    assert read_manifest(str(manifest_path)) == [
+        os.path.join(str(tmpdir), "first.wav"),
+        "/data/second.flac",
+    ]
+
+
+def test_read_completed_paths(tmpdir):
+    transcripts_path = tmpdir.join("transcripts.jsonl")
+    transcripts_path.write(
+        json.dumps({"path": "a.wav", "segments": []})
+        + "\n"
+        + json.dumps({"path": "b.wav", "error": "InvalidDataError"})
+        + '\n{"path": "c.w'
+    )
+
+    assert read_completed_paths(str(transcripts_path)) == {"a.wav"}
+    assert read_completed_paths(str(tmpdir.join("missing.jsonl"))) == set()
+
+
+def test_prepare_audio(jfk_path):
+    vad_options = VadOptions(max_speech_duration_s=30, min_silence_duration_ms=160)
+    prepared = prepare_audio(jfk_path, vad_options, FeatureExtractor())
+
+    assert prepared.error is None
+    assert prepared.duration == 11
+    assert len(prepared.features) == len(prepared.chunks_metadata) == 1
+    assert prepared.features[0].shape[0] == 80
+    assert prepared.chunks_metadata[0]["end_time"] <= 11
+
+
+def test_write_srt(tmpdir):
+    srt_path = str(tmpdir.join("audio.srt"))
+    write_srt(srt_path, [{"start": 0.0, "end": 61.5, "text": " Hello."}])
+
+    with open(srt_path, encoding="utf-8") as srt:
+        assert srt.read() == "1\n00:00:00,000 --> 00:01:01,500\nHello.\n\n"
+
+
+class _FakeTokenizer:
+    def get_suppressed_tokens(self, suppress_tokens):
+        return ()
+
+
+def _fake_model():
+    return types.SimpleNamespace(
+        feature_extractor=FeatureExtractor(),
+        feat_kwargs={},
+        model=types.SimpleNamespace(n_mels=80, is_multilingual=True),
+        get_tokenizer=lambda task, language: _FakeTokenizer(),
+    )
+
+
+def _fake_forward(batches, fail_at_batch=None):
+    def forward(self, features, tokenizer, chunks_metadata, options):
+        if len(batches) == fail_at_batch:
+            raise KeyboardInterrupt
+        batches.append(len(features))
+        return [
+            [
+                {
+                    "start": metadata["start_time"],
+                    "end": metadata["end_time"],
+                    "text": " And so, my fellow Americans.",
+                    "avg_logprob": -0.1,
+                    "no_speech_prob": 0.0,
+                    "language": "en",
+                }
+            ]
+            for metadata in chunks_metadata
+        ]
+
+    return forward
+
+
+def _read_records(output_dir):
+    with open(os.path.join(output_dir, "transcripts.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _copy_inputs(tmpdir, jfk_path):
+    paths = []
+    for relative_path in ["a/jfk.flac", "b/jfk.flac", "jfk.flac"]:
+        path = os.path.join(str(tmpdir), "inputs", relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy(jfk_path, path)
+        paths.append(path)
+    paths.append(os.path.join(str(tmpdir), "inputs", "missing.flac"))
+    return paths
+
+
+def test_runner_batches_across_files(tmpdir, jfk_path, monkeypatch):
+    paths = _copy_inputs(tmpdir, jfk_path)
+    output_dir = str(tmpdir.join("output"))
+    batches = []
+    monkeypatch.setattr(BatchedInferencePipeline, "forward", _fake_forward(batches))
+
+    runner = BatchTranscriptionRunner(
+        _fake_model(), output_dir, batch_size=2, num_workers=1, write_srt=True
+    )
+    stats = runner.run(paths)
+
+    # The single chunks of the 3 files are transcribed in 2 batches.
+    assert batches == [2, 1]
+    assert stats["files"] == 3
+    assert stats["failed"] == 1
+    records = {record["path"]: record for record in _read_records(output_dir)}
+    assert set(records) == set(paths)
+    assert "error" in records[paths[3]]
+    for path in paths[:3]:
+        assert records[path]["language"] == "en"
+        assert records[path]["segments"][0]["language"] == "en"
+    for relative_path in ["a/jfk.srt", "b/jfk.srt", "jfk.srt"]:
+        assert os.path.isfile(os.path.join(output_dir, relative_path))
+
+
+def test_runner_resumes_interrupted_job(tmpdir, jfk_path, monkeypatch):
+    paths = _copy_inputs(tmpdir, jfk_path)[:3]
+    output_dir = str(tmpdir.join("output"))
+    runner = BatchTranscriptionRunner(
+        _fake_model(), output_dir, batch_size=1, num_workers=1, sort_by_length=False
+    )
+
+    batches = []
+    monkeypatch.setattr(
+        BatchedInferencePipeline, "forward", _fake_forward(batches, fail_at_batch=1)
+    )
+    with pytest.raises(KeyboardInterrupt):
+        runner.run(paths)
+    assert len(_read_records(output_dir)) == 1
+
+    batches = []
+    monkeypatch.setattr(BatchedInferencePipeline, "forward", _fake_forward(batches))
+    stats = runner.run(paths)
+
+    assert batches == [1, 1]
+    assert stats["files"] == 2
+    records = _read_records(output_dir)
+    assert sorted(record["path"] for record in records) == sorted(paths)
+    assert all("error" not in record for record in records)
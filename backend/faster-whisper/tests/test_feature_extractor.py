@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+
+from faster_whisper.audio import open_pcm
+from faster_whisper.feature_extractor import FeatureExtractor, StreamingFeatureExtractor
+
+
+def _reference_features(feature_extractor, waveform, padding=160):
+    waveform = np.pad(waveform.astype(np.float32), (0, padding))
+    window = np.hanning(feature_extractor.n_fft + 1)[:-1].astype("float32")
+    stft = feature_extractor.stft(
+        waveform,
+        feature_extractor.n_fft,
+        feature_extractor.hop_length,
+        window=window,
+        return_complex=True,
+    ).astype("complex64")
+    magnitudes = np.abs(stft[..., :-1]) ** 2
+    mel_spec = feature_extractor.mel_filters @ magnitudes
+    log_spec = np.log10(np.clip(mel_spec, a_min=1e-10, a_max=None))
+    log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+def test_features_match_reference():
+    feature_extractor = FeatureExtractor()
+    rng = np.random.default_rng(0)
+
+    for num_samples in (1000, 16000 * 5 + 37, 16000 * 30):
+        waveform = rng.uniform(-0.5, 0.5, num_samples).astype(np.float32)
+        expected = _reference_features(feature_extractor, waveform)
+        features = feature_extractor(waveform)
+
+        assert features.dtype == np.float32
+        assert features.shape == expected.shape
+        np.testing.assert_allclose(features, expected, atol=1e-5)
+
+
+def test_features_out_buffer():
+    feature_extractor = FeatureExtractor(feature_size=128)
+    waveform = np.random.default_rng(0).uniform(-0.5, 0.5, 16000)
+    expected = feature_extractor(waveform)
+
+    out = np.empty_like(expected)
+    features = feature_extractor(waveform, out=out)
+
+    assert features is out
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_features_from_pcm_memmap(tmpdir):
+    feature_extractor = FeatureExtractor()
+    feature_extractor.block_frames = 500
+    samples = np.random.default_rng(0).integers(-8000, 8000, 16000 * 12 + 37)
+    pcm_path = str(tmpdir.join("audio.pcm"))
+    samples.astype("<i2").tofile(pcm_path)
+
+    audio = open_pcm(pcm_path)
+    assert isinstance(audio, np.memmap)
+    assert audio.shape == samples.shape
+
+    for padding in (0, 160):
+        expected = _reference_features(
+            feature_extractor, samples.astype(np.float32) / 32768, padding=padding
+        )
+        features = feature_extractor(audio, padding=padding)
+
+        assert features.shape == expected.shape
+        np.testing.assert_allclose(features, expected, atol=1e-5)
+
+
+def test_features_of_concatenated_chunks():
+    feature_extractor = FeatureExtractor()
+    feature_extractor.block_frames = 300
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, 16000 * 20).astype(np.float32)
+    chunks = [audio[:1000], audio[5000:5000], audio[8000:70000], audio[100000:]]
+
+    expected = feature_extractor(np.concatenate(chunks))
+    features = feature_extractor.concatenated(chunks)
+
+    assert features.shape == expected.shape
+    np.testing.assert_allclose(features, expected, atol=1e-6)
+
+
+def test_batch_features():
+    feature_extractor = FeatureExtractor()
+    waveforms = np.random.default_rng(0).uniform(-0.5, 0.5, (3, 16000 * 2))
+    waveforms[1] *= 0.01
+
+    features = feature_extractor.batch(waveforms)
+
+    assert features.shape == (3, 80, 201)
+    for waveform, feature in zip(waveforms, features):
+        np.testing.assert_allclose(feature, feature_extractor(waveform), atol=1e-6)
+
+
+def test_streaming_features_match_offline():
+    feature_extractor = FeatureExtractor()
+    rng = np.random.default_rng(0)
+
+    for num_samples in (150, 1000, 16000 * 7 + 13):
+        waveform = rng.uniform(-0.5, 0.5, num_samples).astype(np.float32)
+        streaming = StreamingFeatureExtractor(feature_extractor)
+
+        position = 0
+        while position < num_samples:
+            size = int(rng.integers(1, 3000))
+            streaming.append(waveform[position : position + size])
+            position += size
+        streaming.flush()
+
+        np.testing.assert_allclose(
+            streaming.features(), feature_extractor(waveform), atol=1e-6
+        )
+
+
+def test_streaming_features_trim():
+    feature_extractor = FeatureExtractor()
+    waveform = np.random.default_rng(0).uniform(-0.5, 0.5, 16000 * 10)
+    streaming = StreamingFeatureExtractor(feature_extractor)
+
+    assert streaming.append(waveform[:80000]) == streaming.num_frames == 499
+    full_window = streaming.features(300, 499)
+
+    streaming.trim(300)
+    assert streaming.frame_offset == 300
+    np.testing.assert_array_equal(streaming.features(), full_window)
+
+    streaming.append(waveform[80000:])
+    assert streaming.num_frames == 999
+    assert streaming.features(400, 500).shape == (80, 100)
+
+
+def test_chunk_length_does_not_modify_extractor():
+    feature_extractor = FeatureExtractor()
+    waveform = np.zeros(16000, dtype=np.float32)
+
+    with pytest.warns(DeprecationWarning):
+        features = feature_extractor(waveform, chunk_length=10)
+
+    np.testing.assert_array_equal(features, feature_extractor(waveform))
+    assert feature_extractor.n_samples == 480000
+    assert feature_extractor.nb_max_frames == 3000
+    assert feature_extractor.get_num_samples(10) == 160000
+    assert feature_extractor.get_nb_max_frames(10) == 1000
+    assert feature_extractor.get_nb_max_frames() == 3000
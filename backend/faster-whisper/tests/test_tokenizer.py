@@ -1,3 +1,9 @@
+import gc
+import random
+import weakref
+
+import tokenizers
+
 from faster_whisper import WhisperModel
 from faster_whisper.tokenizer import Tokenizer
 from faster_whisper.transcribe import get_suppressed_tokens
@@ -118,3 +124,85 @@ def test_split_on_unicode():
 
     assert words == [" elle", " est", " l", "'", "\ufffd", "é", "rit", "oire"]
     assert word_tokens == [[8404], [871], [287], [6], [246], [526], [3210], [20378]]
+
+
+def _train_byte_level_tokenizer(texts):
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE())
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(
+        add_prefix_space=False
+    )
+    tokenizer.decoder = tokenizers.decoders.ByteLevel()
+    trainer = tokenizers.trainers.BpeTrainer(
+        vocab_size=400,
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tokenizer.train_from_iterator(texts * 10, trainer)
+    tokenizer.add_special_tokens(
+        ["<|endoftext|>", "<|startoftranscript|>", "<|notimestamps|>"]
+    )
+    return tokenizer
+
+
+def test_split_on_unicode_matches_decoding():
+    texts = ["hello world", "日本語のテキストです", "élève à l'école", "😀 emoji"]
+    tokenizer = Tokenizer(_train_byte_level_tokenizer(texts), False)
+
+    rng = random.Random(0)
+    sequences = [tokenizer.encode(text) + [tokenizer.eot] for text in texts]
+    for _ in range(200):
+        sequences.append(
+            [
+                rng.choice(
+                    [
+                        rng.randrange(tokenizer.eot),
+                        tokenizer.eot,
+                        tokenizer.timestamp_begin + rng.randrange(100),
+                    ]
+                )
+                for _ in range(rng.randrange(20))
+            ]
+        )
+
+    for tokens in sequences:
+        assert tokenizer.split_tokens_on_unicode(
+            tokens
+        ) == tokenizer._split_tokens_on_unicode_by_decoding(tokens)
+
+
+def test_encode_prompt():
+    tokenizer = Tokenizer(_train_byte_level_tokenizer(["hello world"]), False)
+
+    tokens = tokenizer.encode_prompt(" hello world")
+    assert tokens == tokenizer.encode(" hello world")
+
+    tokens.append(tokenizer.eot)
+    assert tokenizer.encode_prompt(" hello world") == tokenizer.encode(" hello world")
+
+
+def test_tokenizer_caches_are_released():
+    hf_tokenizer = _train_byte_level_tokenizer(["hello world"])
+    hf_tokenizer.add_special_tokens(
+        ["<|transcribe|>", "<|translate|>", "<|startofprev|>", "<|startoflm|>"]
+    )
+    tokenizer = Tokenizer(hf_tokenizer, False)
+    tokenizer.encode_prompt(" hello world")
+    suppressed_tokens = tokenizer.get_suppressed_tokens((-1,))
+    assert isinstance(suppressed_tokens, tuple)
+    assert tokenizer.get_suppressed_tokens((-1,)) is suppressed_tokens
+
+    reference = weakref.ref(tokenizer)
+    del tokenizer
+    gc.collect()
+    assert reference() is None
+
+
+def test_get_tokenizer():
+    model = WhisperModel("tiny")
+
+    tokenizer = model.get_tokenizer(task="transcribe", language="en")
+    assert model.get_tokenizer(task="transcribe", language="en") is tokenizer
+    assert model.get_tokenizer(task="translate", language="en") is not tokenizer
+    assert (
+        tokenizer.non_speech_tokens
+        is model.get_tokenizer(task="transcribe", language="en").non_speech_tokens
+    )
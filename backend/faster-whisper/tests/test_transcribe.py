@@ -1,7 +1,9 @@
 import inspect
 import os
+import types
 
 import numpy as np
+import pytest
 
 from faster_whisper import BatchedInferencePipeline, WhisperModel, decode_audio
 
@@ -269,3 +271,133 @@ def test_monotonic_timestamps(physcisworks_path):
             assert word.start <= word.end
             assert word.end <= segments[i].end
     assert segments[-1].end <= info.duration
+
+
+def test_fallback_concurrency(jfk_path):
+    model = WhisperModel("tiny", num_workers=2)
+
+    segments, info = model.transcribe(jfk_path, fallback_concurrency=3)
+    segments = list(segments)
+
+    assert info.transcription_options.fallback_concurrency == 3
+    assert len(segments) == 1
+    assert segments[0].temperature == 0.0
+    assert segments[0].text == (
+        " And so my fellow Americans, ask not what your country can do for you, "
+        "ask what you can do for your country."
+    )
+
+
+def test_pipelined_encoding(jfk_path):
+    model = WhisperModel("tiny", num_workers=2)
+
+    for without_timestamps in (False, True):
+        kwargs = dict(chunk_length=5, without_timestamps=without_timestamps)
+        segments, _ = model.transcribe(jfk_path, **kwargs)
+        expected = [(s.start, s.end, s.text) for s in segments]
+
+        segments, info = model.transcribe(jfk_path, pipelined_encoding=True, **kwargs)
+        assert info.transcription_options.pipelined_encoding
+        assert [(s.start, s.end, s.text) for s in segments] == expected
+
+
+def test_draft_model(jfk_path):
+    model = WhisperModel("tiny")
+    segments, _ = model.transcribe(jfk_path)
+    expected = [(s.start, s.end, s.text) for s in segments]
+
+    # A model is its own draft with identical results.
+    model.set_draft_model(WhisperModel("tiny"), log_prob_threshold=-1.0)
+    segments, info = model.transcribe(jfk_path)
+    assert [(s.start, s.end, s.text) for s in segments] == expected
+    assert info.draft_accepted_windows == info.draft_windows > 0
+
+
+def test_draft_model_rejected(jfk_path):
+    model = WhisperModel("tiny")
+    segments, _ = model.transcribe(jfk_path)
+    expected = [(s.start, s.end, s.text) for s in segments]
+
+    # No average log probability reaches 0: every window is decoded by the model.
+    model.set_draft_model(WhisperModel("tiny"), log_prob_threshold=0.0)
+    segments, info = model.transcribe(jfk_path)
+    assert [(s.start, s.end, s.text) for s in segments] == expected
+    assert info.draft_windows > 0
+    assert info.draft_accepted_windows == 0
+
+
+def test_draft_model_encoder_mismatch():
+    model = WhisperModel("tiny")
+    with pytest.raises(ValueError, match="share the same encoder"):
+        model.set_draft_model(WhisperModel("base"))
+
+
+def test_batched_sort_by_length_keeps_order():
+    batches = []
+
+    class RecordingPipeline(BatchedInferencePipeline):
+        def _batch_features(self, audio_chunks, indices):
+            return np.zeros((len(indices), 80, 3000), dtype=np.float32)
+
+        def forward(self, features, tokenizer, chunks_metadata, options):
+            assert features.shape[0] == len(chunks_metadata)
+            batches.append([metadata["start_time"] for metadata in chunks_metadata])
+            return [
+                [
+                    dict(
+                        seek=0,
+                        text=str(metadata["start_time"]),
+                        start=metadata["start_time"],
+                        end=metadata["end_time"],
+                        tokens=[],
+                        avg_logprob=0.0,
+                        no_speech_prob=0.0,
+                        compression_ratio=1.0,
+                    )
+                ]
+                for metadata in chunks_metadata
+            ]
+
+    durations = [5, 29, 3, 30, 28, 4]
+    chunks_metadata = []
+    start_time = 0
+    for duration in durations:
+        chunks_metadata.append(
+            {"start_time": start_time, "end_time": start_time + duration}
+        )
+        start_time += duration + 1
+    audio_chunks = [
+        np.zeros(16000 * duration, dtype=np.float32) for duration in durations
+    ]
+    options = types.SimpleNamespace(word_timestamps=False, temperatures=[0.0])
+
+    pipeline = RecordingPipeline(model=None, sort_by_length=True)
+    segments = list(
+        pipeline._batched_segments_generator(
+            audio_chunks, None, chunks_metadata, 3, options, False
+        )
+    )
+
+    assert batches == [[40, 6, 71], [0, 100, 36]]
+    assert [segment.start for segment in segments] == [
+        metadata["start_time"] for metadata in chunks_metadata
+    ]
+    assert [segment.id for segment in segments] == list(range(1, 7))
+
+
+def test_detect_language_batch(jfk_path):
+    model = WhisperModel("tiny")
+    audio = decode_audio(jfk_path)
+    audios = [audio, audio[: 16000 * 4], np.concatenate([audio] * 4)]
+
+    results = model.detect_language_batch(
+        audios=audios, language_detection_segments=2, batch_size=2
+    )
+
+    assert len(results) == 3
+    for result, clip in zip(results, audios):
+        language, language_probability, _ = model.detect_language(
+            clip, language_detection_segments=2
+        )
+        assert result[0] == language == "en"
+        assert abs(result[1] - language_probability) < 1e-3
@@ -1,17 +1,30 @@
-from time import time
+import time
+
+START_TIME = time.perf_counter()
+
 import argparse
-import math
 from contextlib import asynccontextmanager
 import asyncio
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from models import TripData, UserPreferences
-from route_planning import get_route, modify_route_with_waypoints, find_gas_stations
-from ai_agent import infer_car_specs_from_ai
-from testopenai import test_openai
 import ffmpeg
 import numpy as np
-from whisper_streaming_web.src.whisper_streaming.whisper_online import backend_factory, online_factory, add_shared_args
+from whisper_streaming_web.src.whisper_streaming.whisper_online import backend_factory, draft_backend_factory, online_factory, add_shared_args
+from whisper_streaming_web.src.whisper_streaming.chunk_scheduler import ChunkScheduler
+from whisper_streaming_web.src.whisper_streaming.warmup import warmup_backends
+from whisper_streaming_web.src.whisper_streaming.admission import (
+    ACCEPT,
+    OVERLOADED_CLOSE_CODE,
+    REJECT,
+    AdmissionController,
+    add_admission_args,
+)
+
+# The Google Maps and OpenAI clients, torch and the ASR backends are imported by the
+# endpoints and factories that use them, which keeps the startup of the server (and
+# of each reload) fast. Run with `python -X importtime main.py` to profile the imports.
+IMPORT_TIME = time.perf_counter() - START_TIME
 
 
 ##### LOAD ARGS #####
@@ -28,8 +41,9 @@ parser.add_argument(
 parser.add_argument(
     "--warmup-file",
     type=str,
-    dest="https://github.com/ggerganov/whisper.cpp/raw/master/samples/jfk.wav",
-    help="The path to a speech audio wav file to warm up Whisper so that the very first chunk processing is fast. It can be e.g. https://github.com/ggerganov/whisper.cpp/raw/master/samples/jfk.wav .",
+    dest="warmup_file",
+    default=None,
+    help="The path to a speech audio file to warm up Whisper so that the very first chunk processing is fast, e.g. https://github.com/ggerganov/whisper.cpp/raw/master/samples/jfk.wav once downloaded. By default, a bundled speech sample is used.",
 )
 
 parser.add_argument(
@@ -38,27 +52,70 @@ parser.add_argument(
     default=False,
     help="Whether to enable speaker diarization.",
 )
+parser.add_argument(
+    "--target-lag",
+    type=float,
+    default=None,
+    help="Target delay in seconds between the arrival of audio and its transcription. The processing interval is adapted to the measured processing time to hold it. By default, the audio is processed every --min-chunk-size seconds.",
+)
 
 
 add_shared_args(parser)
+add_admission_args(parser)
 args = parser.parse_args()
 
+# Configuration of the sessions admitted past capacity
+degraded_args = argparse.Namespace(**vars(args))
+degraded_args.model = args.degraded_model or args.model
+degraded_args.min_chunk_size = args.degraded_min_chunk_size or args.min_chunk_size
+
 SAMPLE_RATE = 16000
 CHANNELS = 1
-SAMPLES_PER_SEC = SAMPLE_RATE * int(args.min_chunk_size)
 BYTES_PER_SAMPLE = 2  # s16le = 2 bytes per sample
-BYTES_PER_SEC = SAMPLES_PER_SEC * BYTES_PER_SAMPLE
+BYTES_PER_SEC = SAMPLE_RATE * BYTES_PER_SAMPLE
+READ_SIZE = 65536  # Upper bound of a read, which returns whatever ffmpeg decoded so far
 
 #if args.diarization:
     #from whisper_streaming_web.src.diarization.diarization_online import DiartDiarization
 
 
 ##### LOAD APP #####
+admission = AdmissionController.from_args(args)
+
+warmup_seconds = None  # Set when the warmup is done
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global asr, tokenizer
+    global asr, tokenizer, degraded_asr, draft_asr
+    t = time.perf_counter()
     asr, tokenizer = backend_factory(args)
+    draft_asr = draft_backend_factory(args)
+    degraded_asr = backend_factory(degraded_args)[0] if args.degraded_model else asr
+    print(
+        f"Server modules imported in {IMPORT_TIME:.2f} seconds, "
+        f"ASR models loaded in {time.perf_counter() - t:.2f} seconds."
+    )
+
+    # Sessions are served during the warmup, /ready reports when it is done
+    warmup_task = asyncio.create_task(warmup())
     yield
+    warmup_task.cancel()
+    for backend in {asr, draft_asr, degraded_asr} - {None}:
+        backend.close()
+
+async def warmup():
+    global warmup_seconds
+    start = time.perf_counter()
+    try:
+        warmup_seconds = await asyncio.to_thread(
+            warmup_backends, [asr, draft_asr, degraded_asr], tokenizer, args.warmup_file
+        )
+        print(f"ASR warmed up in {warmup_seconds:.2f} seconds.")
+    except Exception as e:
+        # The models are loaded and serve the sessions, only the first iterations
+        # are slower, so the server is still reported ready.
+        warmup_seconds = time.perf_counter() - start
+        print(f"ASR warmup failed after {warmup_seconds:.2f} seconds: {type(e).__name__}: {e}")
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(
@@ -97,40 +154,68 @@ async def start_ffmpeg_decoder():
 
 @app.websocket("/asr")
 async def websocket_endpoint(websocket: WebSocket):
+    from testopenai import test_openai
+
     await websocket.accept()
     print("WebSocket connection opened.")
 
-    ffmpeg_process = await start_ffmpeg_decoder()
-    pcm_buffer = bytearray()
+    decision = admission.admit()
+    if decision == REJECT:
+        await websocket.close(code=OVERLOADED_CLOSE_CODE, reason="Server overloaded, try again later.")
+        return
+    session_args = args if decision == ACCEPT else degraded_args
+    scheduler = ChunkScheduler(session_args.min_chunk_size, target_lag=args.target_lag)
+
     print("Loading online.")
-    online = online_factory(args, asr, tokenizer)
+    online = online_factory(
+        session_args, asr if decision == ACCEPT else degraded_asr, tokenizer, draft_asr=draft_asr
+    )
     print("Online loaded.")
 
+    ffmpeg_process = await start_ffmpeg_decoder()
+    pcm_buffer = bytearray()
+
     #if args.diarization:
        #diarization = DiartDiarization(SAMPLE_RATE)
 
+    query_parts = []  # Committed text of the current query, joined when it is sent
+    user_finish_query = False
+    processing = None
+
+    # Process all the audio received so far, while the reader keeps reading
+    async def process_audio(pcm_array):
+        nonlocal user_finish_query
+        loop = asyncio.get_event_loop()
+        try:
+            online.insert_audio_chunk(pcm_array)
+            transcription = await loop.run_in_executor(None, online.process_iter)
+            if transcription.text != '':
+                query_parts.append(transcription.text)
+                print("query:" + transcription.text)
+            user_finish_query = True
+        except Exception as e:
+            print(f"Exception in process_audio: {e}")
+        finally:
+            scheduler.done()
+
     # Continuously read decoded PCM from ffmpeg stdout in a background task
     async def ffmpeg_stdout_reader():
-        nonlocal pcm_buffer
+        nonlocal pcm_buffer, query_parts, user_finish_query, processing
         loop = asyncio.get_event_loop()
-        full_transcription = ""
-        beg = time()
-        user_finish_query = False
         
         while True:
             try:
-                elapsed_time = math.floor((time() - beg) * 10) / 10 # Round to 0.1 sec
-                ffmpeg_buffer_from_duration = max(int(32000 * elapsed_time), 4096)
-                beg = time()
+                # 读取 ffmpeg 目前已解码的全部数据（处理期间到达的音频会合并到下一次处理）
                 chunk = await loop.run_in_executor(
-                    None, ffmpeg_process.stdout.read, ffmpeg_buffer_from_duration
+                    None, ffmpeg_process.stdout.read1, READ_SIZE
                 )
                 if not chunk:
                     print("FFmpeg stdout closed.")
                     break
 
                 pcm_buffer.extend(chunk)
-                if len(pcm_buffer) >= BYTES_PER_SEC:
+                scheduler.add_audio(len(chunk) / BYTES_PER_SEC)
+                if scheduler.ready():
                     # 将 int16 数据转换为 float32 数据
                     pcm_array = np.frombuffer(pcm_buffer, dtype=np.int16).astype(np.float32) / 32768.0
                     pcm_buffer = bytearray()
@@ -140,31 +225,29 @@ async def websocket_endpoint(websocket: WebSocket):
                     MIN_LOUDNESS_THRESHOLD = 0.008  # 音量阈值
                     
                     if rms > MIN_LOUDNESS_THRESHOLD:
-                        online.insert_audio_chunk(pcm_array)
-                        transcription = online.process_iter()
-                        full_transcription += transcription.text
-                        if transcription.text != '':
-                            print("query:" + transcription.text)
-                        buffer = online.get_buffer()
-                        user_finish_query = True
-                    
-                        if buffer in full_transcription:  # With VAC，buffer 更新可能延迟
-                            buffer = ""
+                        scheduler.start()
+                        processing = asyncio.create_task(process_audio(pcm_array))
                     else:
+                        scheduler.skip()
                         #如果用户完成指令，并且内容不为空
-                        if user_finish_query and full_transcription != '':
-                            response = test_openai(full_transcription)
+                        if user_finish_query and query_parts:
+                            response = test_openai("".join(query_parts))
                             print("response:" + response)
                             user_finish_query = False
-                            full_transcription = ''
+                            query_parts = []
 
             except Exception as e:
                 print(f"Exception in ffmpeg_stdout_reader: {e}")
                 break
 
+        if processing is not None:
+            await processing
         print("Exiting ffmpeg_stdout_reader...")
 
     stdout_reader_task = asyncio.create_task(ffmpeg_stdout_reader())
+    # Only a session whose setup succeeded takes an admission slot, which the
+    # finally block below releases
+    admission.add(scheduler, online.language_stats)
 
     try:
         while True:
@@ -185,6 +268,8 @@ async def websocket_endpoint(websocket: WebSocket):
         except:
             pass
         stdout_reader_task.cancel()
+        if processing is not None:
+            processing.cancel()
 
         try:
             ffmpeg_process.stdout.close()
@@ -192,6 +277,7 @@ async def websocket_endpoint(websocket: WebSocket):
             pass
 
         ffmpeg_process.wait()
+        admission.remove(scheduler)
         del online
         
         #if args.diarization:
@@ -199,11 +285,27 @@ async def websocket_endpoint(websocket: WebSocket):
             #diarization.close()
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe, which fails until the ASR backends are warmed up."""
+    if warmup_seconds is None:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"ready": True, "warmup_seconds": warmup_seconds}
+
+@app.get("/metrics")
+async def metrics():
+    """Admission counters, server load and per-session transcription lag."""
+    return admission.stats()
+
+
 @app.post("/plan_trip")
 async def plan_trip(trip_data: TripData, preferences: UserPreferences):
     """
     Plan the trip by generating a route and refueling plan.
     """
+    from route_planning import get_route, modify_route_with_waypoints, find_gas_stations
+    from ai_agent import infer_car_specs_from_ai
+
     try:
         route_data = get_route(trip_data.origin, trip_data.destination)
 
@@ -0,0 +1,164 @@
+import argparse
+import logging
+from typing import Callable, Dict, Optional
+
+from whisper_streaming_web.src.whisper_streaming.chunk_scheduler import ChunkScheduler
+
+logger = logging.getLogger(__name__)
+
+# WebSocket close code for rejected sessions (1013 = Try Again Later)
+OVERLOADED_CLOSE_CODE = 1013
+
+ACCEPT = "accept"
+DEGRADE = "degrade"
+REJECT = "reject"
+
+
+def add_admission_args(parser):
+    """admission control args for the servers
+    parser: argparse.ArgumentParser object
+    """
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=None,
+        help="Maximum number of concurrent ASR sessions. Further sessions are rejected.",
+    )
+    parser.add_argument(
+        "--max-load",
+        type=float,
+        default=None,
+        help="Load over which new sessions are degraded, or rejected when no degradation is configured. The load is the sum of the real-time factors (processing time over audio duration) of the sessions that processed audio in the last --load-idle-seconds, e.g. 1.0 for one fully busy worker. Silent sessions do not count.",
+    )
+    parser.add_argument(
+        "--load-idle-seconds",
+        type=float,
+        default=10.0,
+        help="Seconds without processing after which a session no longer counts in the load.",
+    )
+    parser.add_argument(
+        "--max-queue-depth",
+        type=int,
+        default=None,
+        help="Number of concurrent process_iter calls over which new sessions are degraded or rejected.",
+    )
+    parser.add_argument(
+        "--degraded-model",
+        type=str,
+        default=None,
+        choices="tiny.en,tiny,base.en,base,small.en,small,medium.en,medium,large-v1,large-v2,large-v3,large,large-v3-turbo".split(
+            ","
+        ),
+        help="Smaller model loaded at startup and used by the sessions admitted past capacity.",
+    )
+    parser.add_argument(
+        "--degraded-min-chunk-size",
+        type=float,
+        default=None,
+        help="Minimum chunk size in seconds of the sessions admitted past capacity.",
+    )
+
+
+class AdmissionController:
+    """
+    Decides whether a new ASR session is accepted, degraded or rejected, from the
+    number of open sessions, the number of running iterations (queue depth) and the
+    sum of the real-time factors of the sessions (load).
+
+    A session that did not process audio for `idle_seconds` (e.g. a silent driver,
+    whose audio is skipped) does not count in the load.
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        max_load: Optional[float] = None,
+        max_queue_depth: Optional[int] = None,
+        can_degrade: bool = False,
+        idle_seconds: float = 10.0,
+    ):
+        self.max_sessions = max_sessions
+        self.max_load = max_load
+        self.max_queue_depth = max_queue_depth
+        self.can_degrade = can_degrade
+        self.idle_seconds = idle_seconds
+
+        # Maps each open session to an optional callable returning extra session stats
+        self.sessions: Dict[ChunkScheduler, Optional[Callable[[], dict]]] = {}
+        self.accepted = 0
+        self.degraded = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "AdmissionController":
+        return cls(
+            max_sessions=args.max_sessions,
+            max_load=args.max_load,
+            max_queue_depth=args.max_queue_depth,
+            can_degrade=(
+                args.degraded_model is not None
+                or args.degraded_min_chunk_size is not None
+            ),
+            idle_seconds=args.load_idle_seconds,
+        )
+
+    def load(self) -> float:
+        return sum(
+            session.real_time_factor()
+            for session in self.sessions
+            if not session.is_idle(self.idle_seconds)
+        )
+
+    def queue_depth(self) -> int:
+        return sum(1 for session in self.sessions if session.start_time is not None)
+
+    def admit(self) -> str:
+        """Returns ACCEPT, DEGRADE or REJECT for a new session."""
+        if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+            decision = REJECT
+        elif (self.max_load is not None and self.load() >= self.max_load) or (
+            self.max_queue_depth is not None
+            and self.queue_depth() >= self.max_queue_depth
+        ):
+            decision = DEGRADE if self.can_degrade else REJECT
+        else:
+            decision = ACCEPT
+
+        if decision == ACCEPT:
+            self.accepted += 1
+        elif decision == DEGRADE:
+            self.degraded += 1
+        else:
+            self.rejected += 1
+        logger.info(f"Admission: {decision} ({len(self.sessions)} open sessions, load {self.load():.2f})")
+        return decision
+
+    def add(
+        self,
+        session: ChunkScheduler,
+        extra_stats: Optional[Callable[[], dict]] = None,
+    ):
+        self.sessions[session] = extra_stats
+
+    def remove(self, session: ChunkScheduler):
+        self.sessions.pop(session, None)
+
+    def session_stats(self) -> list:
+        stats = []
+        for session, extra_stats in self.sessions.items():
+            session_stats = session.stats()
+            if extra_stats is not None:
+                session_stats.update(extra_stats())
+            stats.append(session_stats)
+        return stats
+
+    def stats(self) -> dict:
+        return {
+            "open_sessions": len(self.sessions),
+            "load": self.load(),
+            "queue_depth": self.queue_depth(),
+            "accepted": self.accepted,
+            "degraded": self.degraded,
+            "rejected": self.rejected,
+            "sessions": self.session_stats(),
+        }
@@ -1,10 +1,8 @@
 import sys
 import logging
 import io
-import soundfile as sf
 import math
-import torch
-from typing import List
+from typing import List, Optional, Tuple, Union
 import numpy as np
 from whisper_streaming_web.src.whisper_streaming.timed_objects import ASRToken
 
@@ -33,12 +31,53 @@ class ASRBase:
     def load_model(self, modelsize, cache_dir, model_dir):
         raise NotImplementedError("must be implemented in the child class")
 
-    def transcribe(self, audio, init_prompt=""):
+    def transcribe(self, audio, init_prompt="", language=None):
+        """
+        language: language of the audio for this call, instead of the language of the ASR.
+        """
         raise NotImplementedError("must be implemented in the child class")
 
+    def encode_prompt(self, text):
+        """
+        Returns the token ids of a prompt word, or None if the backend only accepts
+        text prompts.
+        """
+        return None
+
+    def detect_language(self, audio) -> Optional[Tuple[str, float]]:
+        """
+        Returns the language of the audio and its probability, or None if the backend
+        only detects the language while transcribing.
+        """
+        return None
+
+    def confidence(self, res) -> Optional[float]:
+        """
+        Returns the average log probability of a transcription result, or None if the
+        backend does not report it or nothing was transcribed.
+        """
+        return None
+
+    def warmup(self, audio, chunk_seconds=(1.0, 5.0, 10.0)):
+        """
+        Transcribes the beginning of `audio` with the given durations, so that the
+        first session does not pay the initialization and first-call costs.
+        """
+        for seconds in chunk_seconds:
+            res = self.transcribe(audio[: int(seconds * 16000)])
+            self.ts_words(res)
+
     def use_vad(self):
         raise NotImplementedError("must be implemented in the child class")
 
+    def use_alignment_batching(self):
+        """Batch the word alignments of the sessions sharing this ASR, if supported."""
+        pass
+
+    def close(self):
+        """Release the resources of the ASR, e.g. its background threads."""
+        pass
+
 
 class WhisperTimestampedASR(ASRBase):
     """Uses whisper_timestamped as the backend."""
@@ -54,11 +93,11 @@ class WhisperTimestampedASR(ASRBase):
             logger.debug("ignoring model_dir, not implemented")
         return whisper.load_model(modelsize, download_root=cache_dir)
 
-    def transcribe(self, audio, init_prompt=""):
+    def transcribe(self, audio, init_prompt="", language=None):
         result = self.transcribe_timestamped(
             self.model,
             audio,
-            language=self.original_language,
+            language=language or self.original_language,
             initial_prompt=init_prompt,
             verbose=None,
             condition_on_previous_text=True,
@@ -92,6 +131,7 @@ class FasterWhisperASR(ASRBase):
     sep = ""
 
     def load_model(self, modelsize=None, cache_dir=None, model_dir=None):
+        import ctranslate2
         from faster_whisper import WhisperModel
 
         if model_dir is not None:
@@ -102,7 +142,7 @@ class FasterWhisperASR(ASRBase):
             model_size_or_path = modelsize
         else:
             raise ValueError("Either modelsize or model_dir must be set")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
         compute_type = "float16" if device == "cuda" else "float32"
 
         model = WhisperModel(
@@ -113,10 +153,18 @@ class FasterWhisperASR(ASRBase):
         )
         return model
 
-    def transcribe(self, audio: np.ndarray, init_prompt: str = "") -> list:
+    def encode_prompt(self, text: str) -> List[int]:
+        return self.model.hf_tokenizer.encode(text, add_special_tokens=False).ids
+
+    def transcribe(
+        self,
+        audio: np.ndarray,
+        init_prompt: Union[str, List[int]] = "",
+        language: Optional[str] = None,
+    ) -> list:
         segments, info = self.model.transcribe(
             audio,
-            language=self.original_language,
+            language=language or self.original_language,
             initial_prompt=init_prompt,
             beam_size=5,
             word_timestamps=True,
@@ -125,6 +173,14 @@ class FasterWhisperASR(ASRBase):
         )
         return list(segments)
 
+    def detect_language(self, audio: np.ndarray) -> Optional[Tuple[str, float]]:
+        if not self.model.model.is_multilingual:
+            return "en", 1.0
+        language, probability, _ = self.model.detect_language(
+            audio, vad_filter=self.transcribe_kargs.get("vad_filter", False)
+        )
+        return language, probability
+
     def ts_words(self, segments) -> List[ASRToken]:
         tokens = []
         for segment in segments:
@@ -135,12 +191,45 @@ class FasterWhisperASR(ASRBase):
                 tokens.append(token)
         return tokens
 
+    def confidence(self, segments) -> Optional[float]:
+        logprobs = [segment.avg_logprob for segment in segments if segment.no_speech_prob <= 0.9]
+        if not logprobs:
+            return None
+        return sum(logprobs) / len(logprobs)
+
+    def warmup(self, audio, chunk_seconds=(1.0, 5.0, 10.0)):
+        super().warmup(audio, chunk_seconds)
+        # Also run the code paths of the other transcription options
+        chunk = audio[: int(chunk_seconds[-1] * 16000)]
+        for word_timestamps, vad_filter in ((False, False), (False, True), (True, True)):
+            segments, info = self.model.transcribe(
+                chunk,
+                language=self.original_language,
+                beam_size=5,
+                word_timestamps=word_timestamps,
+                vad_filter=vad_filter,
+                task=self.transcribe_kargs.get("task", "transcribe"),
+            )
+            list(segments)
+        self.detect_language(chunk)
+
     def segments_end_ts(self, segments) -> List[float]:
         return [segment.end for segment in segments]
 
     def use_vad(self):
         self.transcribe_kargs["vad_filter"] = True
 
+    def use_alignment_batching(self):
+        from faster_whisper.alignment import AlignmentScheduler
+
+        if self.model.alignment_scheduler is None:
+            self.model.alignment_scheduler = AlignmentScheduler(self.model.model)
+
+    def close(self):
+        if self.model.alignment_scheduler is not None:
+            self.model.alignment_scheduler.close()
+            self.model.alignment_scheduler = None
+
     def set_translate_task(self):
         self.transcribe_kargs["task"] = "translate"
 
@@ -191,12 +280,12 @@ class MLXWhisper(ASRBase):
         else:
             raise ValueError(f"Model name '{model_name}' is not recognized or not supported.")
 
-    def transcribe(self, audio, init_prompt=""):
+    def transcribe(self, audio, init_prompt="", language=None):
         if self.transcribe_kargs:
             logger.warning("Transcribe kwargs (vad, task) are not compatible with MLX Whisper and will be ignored.")
         segments = self.model(
             audio,
-            language=self.original_language,
+            language=language or self.original_language,
             initial_prompt=init_prompt,
             word_timestamps=True,
             condition_on_previous_text=True,
@@ -263,7 +352,12 @@ class OpenaiApiASR(ASRBase):
     def segments_end_ts(self, res) -> List[float]:
         return [s.end for s in res.words]
 
-    def transcribe(self, audio_data, prompt=None, *args, **kwargs):
+    def encode_prompt(self, text):
+        return None
+
+    def transcribe(self, audio_data, prompt=None, *args, language=None, **kwargs):
+        import soundfile as sf
+
         buffer = io.BytesIO()
         buffer.name = "temp.wav"
         sf.write(buffer, audio_data, samplerate=16000, format="WAV", subtype="PCM_16")
@@ -276,8 +370,9 @@ class OpenaiApiASR(ASRBase):
             "temperature": self.temperature,
             "timestamp_granularities": ["word", "segment"],
         }
-        if self.task != "translate" and self.original_language:
-            params["language"] = self.original_language
+        language = language or self.original_language
+        if self.task != "translate" and language:
+            params["language"] = language
         if prompt:
             params["prompt"] = prompt
         proc = self.client.audio.translations if self.task == "translate" else self.client.audio.transcriptions
@@ -285,6 +380,10 @@ class OpenaiApiASR(ASRBase):
         logger.debug(f"OpenAI API processed accumulated {self.transcribed_seconds} seconds")
         return transcript
 
+    def warmup(self, audio, chunk_seconds=(1.0, 5.0, 10.0)):
+        # Nothing runs locally, and the API calls are billed
+        pass
+
     def use_vad(self):
         self.use_vad_opt = True
 
@@ -0,0 +1,122 @@
+import time
+from typing import Optional
+
+
+class ChunkScheduler:
+    """
+    Decides when a streaming session runs `process_iter` on the audio received so far.
+
+    Every iteration processes all the audio that arrived since the previous one, so
+    iterations are coalesced when the processing is slower than the audio arrival.
+    The lag of an iteration is the time between the arrival of its oldest audio and
+    the end of its processing.
+
+    With a `target_lag`, the processing interval is adapted to the measured processing
+    time: the session waits up to `target_lag - processing time` to process bigger
+    chunks, which saves iterations while holding the target lag. The interval never
+    goes below `min_chunk_size`.
+    """
+
+    def __init__(
+        self,
+        min_chunk_size: float,
+        target_lag: Optional[float] = None,
+        max_chunk_size: float = 10.0,
+        smoothing: float = 0.3,
+    ):
+        """
+        min_chunk_size: minimum audio duration in seconds processed by an iteration.
+        target_lag: lag in seconds to hold, or None to process every `min_chunk_size`.
+        max_chunk_size: maximum processing interval in seconds.
+        smoothing: weight of the last measure in the processing time average.
+        """
+        self.min_chunk_size = min_chunk_size
+        self.target_lag = target_lag
+        self.max_chunk_size = max(max_chunk_size, min_chunk_size)
+        self.smoothing = smoothing
+
+        self.interval = min_chunk_size
+        self.pending_seconds = 0.0
+        self.first_arrival: Optional[float] = None
+        self.start_time: Optional[float] = None
+        self.batch_arrival: Optional[float] = None
+        self.processing_time: Optional[float] = None
+        self.last_done: Optional[float] = None
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.iterations = 0
+        self.processed_seconds = 0.0
+
+    def add_audio(self, seconds: float):
+        """Record the arrival of `seconds` of audio."""
+        if self.first_arrival is None:
+            self.first_arrival = time.monotonic()
+        self.pending_seconds += seconds
+
+    def ready(self) -> bool:
+        """
+        Whether the audio received so far should be processed now. It is never the
+        case while an iteration is running.
+        """
+        return (
+            self.start_time is None
+            and self.pending_seconds > 0
+            and self.pending_seconds >= self.interval
+        )
+
+    def start(self):
+        """Record the start of an iteration over all the pending audio."""
+        self.start_time = time.monotonic()
+        self.batch_arrival = self.first_arrival
+        self.processed_seconds += self.pending_seconds
+        self.pending_seconds = 0.0
+        self.first_arrival = None
+
+    def done(self):
+        """Record the end of the running iteration and adapt the interval."""
+        now = time.monotonic()
+        processing_time = now - self.start_time
+        self.start_time = None
+        self.last_done = now
+        self.lag = now - self.batch_arrival
+        self.max_lag = max(self.max_lag, self.lag)
+        self.iterations += 1
+
+        if self.processing_time is None:
+            self.processing_time = processing_time
+        else:
+            self.processing_time += self.smoothing * (processing_time - self.processing_time)
+
+        if self.target_lag is not None:
+            self.interval = min(
+                max(self.target_lag - self.processing_time, self.min_chunk_size),
+                self.max_chunk_size,
+            )
+
+    def skip(self):
+        """Drop the pending audio without processing it (e.g. silence)."""
+        self.pending_seconds = 0.0
+        self.first_arrival = None
+
+    def is_idle(self, idle_seconds: float) -> bool:
+        """Whether no iteration is running nor ended in the last `idle_seconds` seconds."""
+        if self.start_time is not None:
+            return False
+        return self.last_done is None or time.monotonic() - self.last_done > idle_seconds
+
+    def real_time_factor(self) -> float:
+        """Average processing time over the audio duration processed per iteration."""
+        if not self.iterations or not self.processed_seconds:
+            return 0.0
+        return self.processing_time / (self.processed_seconds / self.iterations)
+
+    def stats(self) -> dict:
+        return {
+            "real_time_factor": self.real_time_factor(),
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "interval": self.interval,
+            "processing_time": self.processing_time,
+            "iterations": self.iterations,
+            "processed_seconds": self.processed_seconds,
+        }
@@ -1,7 +1,8 @@
 import sys
 import numpy as np
 import logging
-from typing import List, Tuple, Optional
+from collections import deque
+from typing import Deque, List, Tuple, Optional
 from whisper_streaming_web.src.whisper_streaming.timed_objects import ASRToken, Sentence, Transcript
 
 logger = logging.getLogger(__name__)
@@ -77,6 +78,14 @@ class HypothesisBuffer:
         self.committed_in_buffer.extend(committed)
         return committed
 
+    def tentative(self, draft_tokens: List[ASRToken]) -> List[ASRToken]:
+        """
+        Returns the uncommitted hypothesis, extended with the tokens of a draft
+        hypothesis that start after it.
+        """
+        end = self.buffer[-1].end if self.buffer else self.last_committed_time
+        return self.buffer + [token for token in draft_tokens if token.start >= end - 0.1]
+
     def pop_committed(self, time: float):
         """
         Remove tokens (from the beginning) that have ended before `time`.
@@ -94,8 +103,21 @@ class OnlineASRProcessor:
     The processor supports two types of buffer trimming:
       - "sentence": trims at sentence boundaries (using a sentence tokenizer)
       - "segment": trims at fixed segment durations.
+
+    With a draft ASR (e.g. a tiny model), the draft model transcribes the buffer on
+    each iteration to update the tentative text, and the main ASR only runs once
+    `confirm_interval` seconds of new audio arrived. Only the main ASR commits text.
+
+    When the ASR detects the language, the language detected with a probability of
+    at least `language_lock_threshold` is locked for the session, so that the
+    following iterations do not detect it again. It is unlocked after
+    LANGUAGE_UNLOCK_ITERATIONS transcriptions in a row with an average log
+    probability below `language_unlock_logprob`, or with `reset_language`.
     """
     SAMPLING_RATE = 16000
+    PROMPT_MAX_CHARS = 200
+    LANGUAGE_LOCK_MIN_SECONDS = 2.0
+    LANGUAGE_UNLOCK_ITERATIONS = 3
 
     def __init__(
         self,
@@ -103,6 +125,10 @@ class OnlineASRProcessor:
         tokenize_method: Optional[callable] = None,
         buffer_trimming: Tuple[str, float] = ("segment", 15),
         logfile=sys.stderr,
+        draft_asr=None,
+        confirm_interval: float = 1.0,
+        language_lock_threshold: float = 0.8,
+        language_unlock_logprob: float = -1.0,
     ):
         """
         asr: An ASR system object (for example, a WhisperASR instance) that
@@ -110,8 +136,23 @@ class OnlineASRProcessor:
              a `segments_end_ts` method, and a separator attribute `sep`.
         tokenize_method: A function that receives text and returns a list of sentence strings.
         buffer_trimming: A tuple (option, seconds), where option is either "sentence" or "segment".
+        draft_asr: An optional faster, less accurate ASR system object producing the tentative text.
+        confirm_interval: Seconds of new audio between two runs of `asr` when `draft_asr` is set.
+        language_lock_threshold: Probability from which a detected language is locked for the session.
+        language_unlock_logprob: Average log probability under which a transcription is low confidence.
         """
         self.asr = asr
+        self.draft_asr = draft_asr
+        self.confirm_interval = confirm_interval
+        self.language_lock_threshold = language_lock_threshold
+        self.language_unlock_logprob = language_unlock_logprob
+
+        # The language is kept across the buffer resets of the session.
+        self.language: Optional[str] = None
+        self.language_probability = 0.0
+        self.language_detections = 0
+        self.language_locks = 0
+        self.low_confidence_iterations = 0
         self.tokenize = tokenize_method
         self.logfile = logfile
 
@@ -134,11 +175,24 @@ class OnlineASRProcessor:
         self.transcript_buffer = HypothesisBuffer(logfile=self.logfile)
         self.buffer_time_offset = offset if offset is not None else 0.0
         self.transcript_buffer.last_committed_time = self.buffer_time_offset
+        # Committed tokens within the current audio buffer.
         self.committed: List[ASRToken] = []
+        # Committed tokens before the audio buffer, used as the prompt. Only the last
+        # PROMPT_MAX_CHARS characters are kept, with their token ids when the ASR
+        # backend can encode them.
+        self.prompt_words: Deque[ASRToken] = deque()
+        self.prompt_token_ids: Deque[List[int]] = deque()
+        self.prompt_length = 0
+        # Tentative tokens of the draft ASR, and audio samples received in total and
+        # when the main ASR last ran.
+        self.draft_tokens: List[ASRToken] = []
+        self.total_samples = 0
+        self.confirmed_samples = 0
 
     def insert_audio_chunk(self, audio: np.ndarray):
         """Append an audio chunk (a numpy array) to the current audio buffer."""
         self.audio_buffer = np.append(self.audio_buffer, audio)
+        self.total_samples += len(audio)
 
     def prompt(self) -> Tuple[str, str]:
         """
@@ -147,29 +201,134 @@ class OnlineASRProcessor:
             outside the current audio buffer.
           - context is the committed text within the current audio buffer.
         """
-        k = len(self.committed)
-        while k > 0 and self.committed[k - 1].end > self.buffer_time_offset:
-            k -= 1
-
-        prompt_tokens = self.committed[:k]
-        prompt_words = [token.text for token in prompt_tokens]
-        prompt_list = []
-        length_count = 0
-        # Use the last words until reaching 200 characters.
-        while prompt_words and length_count < 200:
-            word = prompt_words.pop(-1)
-            length_count += len(word) + 1
-            prompt_list.append(word)
-        non_prompt_tokens = self.committed[k:]
-        context_text = self.asr.sep.join(token.text for token in non_prompt_tokens)
-        return self.asr.sep.join(prompt_list[::-1]), context_text
+        prompt_text = self.asr.sep.join(token.text for token in self.prompt_words)
+        context_text = self.asr.sep.join(token.text for token in self.committed)
+        return prompt_text, context_text
+
+    def prompt_tokens(self) -> Optional[List[int]]:
+        """
+        Returns the token ids of the prompt, or None if the ASR backend only
+        accepts text prompts.
+        """
+        if not self.prompt_words or len(self.prompt_token_ids) != len(self.prompt_words):
+            return None
+        return [token_id for ids in self.prompt_token_ids for token_id in ids]
+
+    def update_prompt(self):
+        """
+        Move the committed tokens that ended before the audio buffer to the prompt,
+        encoding each word once.
+        """
+        while self.committed and self.committed[0].end <= self.buffer_time_offset:
+            token = self.committed.pop(0)
+            self.prompt_words.append(token)
+            self.prompt_length += len(token.text) + 1
+            token_ids = self.asr.encode_prompt(token.text)
+            if token_ids is not None:
+                self.prompt_token_ids.append(token_ids)
+
+        # Keep the shortest suffix of at least PROMPT_MAX_CHARS characters.
+        while (
+            self.prompt_words
+            and self.prompt_length - len(self.prompt_words[0].text) - 1 >= self.PROMPT_MAX_CHARS
+        ):
+            token = self.prompt_words.popleft()
+            self.prompt_length -= len(token.text) + 1
+            if len(self.prompt_token_ids) > len(self.prompt_words):
+                self.prompt_token_ids.popleft()
 
     def get_buffer(self):
         """
         Get the unvalidated buffer in string format.
         """
-        return self.concatenate_tokens(self.transcript_buffer.buffer).text
-        
+        return self.concatenate_tokens(self.transcript_buffer.tentative(self.draft_tokens)).text
+
+    def session_language(self) -> Optional[str]:
+        """
+        Returns the language to transcribe the buffer with, or None to let the ASR use
+        its own language setting. Until a language is locked, it is detected on the
+        buffer, which replaces the detection the ASR would do while transcribing.
+        """
+        if self.asr.original_language is not None:
+            return None
+        if self.language is not None:
+            return self.language
+
+        detected = self.asr.detect_language(self.audio_buffer)
+        if detected is None:
+            return None
+        language, probability = detected
+        self.language_detections += 1
+        if (
+            probability >= self.language_lock_threshold
+            and len(self.audio_buffer) >= self.LANGUAGE_LOCK_MIN_SECONDS * self.SAMPLING_RATE
+        ):
+            self.language = language
+            self.language_probability = probability
+            self.language_locks += 1
+            logger.info(f"Language locked to {language} (probability {probability:.2f})")
+        return language
+
+    def check_language(self, res):
+        """
+        Unlocks the language after LANGUAGE_UNLOCK_ITERATIONS low confidence
+        transcriptions in a row, e.g. when the speaker switched language.
+        """
+        if self.language is None:
+            return
+        confidence = self.asr.confidence(res)
+        if confidence is None:
+            return
+        if confidence >= self.language_unlock_logprob:
+            self.low_confidence_iterations = 0
+            return
+        self.low_confidence_iterations += 1
+        if self.low_confidence_iterations >= self.LANGUAGE_UNLOCK_ITERATIONS:
+            logger.info(f"Language {self.language} unlocked after low confidence transcriptions")
+            self.reset_language()
+
+    def reset_language(self):
+        """Detect the language again from the next iteration."""
+        self.language = None
+        self.low_confidence_iterations = 0
+
+    def language_stats(self) -> dict:
+        return {
+            "language": self.language,
+            "language_probability": self.language_probability,
+            "language_detections": self.language_detections,
+            "language_locks": self.language_locks,
+        }
+
+    def confirmation_due(self) -> bool:
+        """Whether the main ASR should run on this iteration."""
+        if self.draft_asr is None:
+            return True
+        new_samples = self.total_samples - self.confirmed_samples
+        return new_samples >= self.confirm_interval * self.SAMPLING_RATE
+
+    def process_draft_iter(self) -> Transcript:
+        """
+        Transcribes the current audio buffer with the draft ASR to update the
+        tentative text. Nothing is committed.
+        """
+        prompt, _ = self.prompt()
+        logger.debug(
+            f"Drafting {len(self.audio_buffer)/self.SAMPLING_RATE:.2f} seconds from {self.buffer_time_offset:.2f}"
+        )
+        res = self.draft_asr.transcribe(
+            self.audio_buffer, init_prompt=prompt, language=self.language
+        )
+        tokens = [
+            token.with_offset(self.buffer_time_offset)
+            for token in self.draft_asr.ts_words(res)
+        ]
+        self.draft_tokens = [
+            token
+            for token in tokens
+            if token.start > self.transcript_buffer.last_committed_time - 0.1
+        ]
+        return self.concatenate_tokens([])
 
     def process_iter(self) -> Transcript:
         """
@@ -177,11 +336,20 @@ class OnlineASRProcessor:
 
         Returns a Transcript object representing the committed transcript.
         """
-        prompt_text, _ = self.prompt()
+        if not self.confirmation_due():
+            return self.process_draft_iter()
+        self.confirmed_samples = self.total_samples
+        self.draft_tokens = []
+
+        prompt = self.prompt_tokens()
+        if prompt is None:
+            prompt, _ = self.prompt()
         logger.debug(
             f"Transcribing {len(self.audio_buffer)/self.SAMPLING_RATE:.2f} seconds from {self.buffer_time_offset:.2f}"
         )
-        res = self.asr.transcribe(self.audio_buffer, init_prompt=prompt_text)
+        language = self.session_language()
+        res = self.asr.transcribe(self.audio_buffer, init_prompt=prompt, language=language)
+        self.check_language(res)
         tokens = self.asr.ts_words(res)  # Expecting List[ASRToken]
         self.transcript_buffer.insert(tokens, self.buffer_time_offset)
         committed_tokens = self.transcript_buffer.flush()
@@ -257,6 +425,7 @@ class OnlineASRProcessor:
         cut_seconds = time - self.buffer_time_offset
         self.audio_buffer = self.audio_buffer[int(cut_seconds * self.SAMPLING_RATE):]
         self.buffer_time_offset = time
+        self.update_prompt()
         logger.debug(
             f"Audio buffer length after chunking: {len(self.audio_buffer)/self.SAMPLING_RATE:.2f}s"
         )
@@ -427,4 +596,10 @@ class VACOnlineASRProcessor:
         """
         Get the unvalidated buffer in string format.
         """
-        return self.online.concatenate_tokens(self.online.transcript_buffer.buffer).text
+        return self.online.get_buffer()
+
+    def reset_language(self):
+        self.online.reset_language()
+
+    def language_stats(self) -> dict:
+        return self.online.language_stats()
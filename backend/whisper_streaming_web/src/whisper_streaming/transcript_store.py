@@ -0,0 +1,123 @@
+import json
+import logging
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from whisper_streaming_web.src.whisper_streaming.timed_objects import Transcript
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptStore:
+    """
+    Transcript of a streaming session with bounded memory.
+
+    Committed chunks are kept as {beg, end, text, speaker} dicts only while their
+    speaker may still be reassigned by the diarization (the last `pending_chunks`).
+    Older chunks are merged once into lines, so building the lines to send does not
+    iterate over the whole session history.
+
+    Only the last `max_lines` lines are kept in memory. Older lines are appended as
+    JSON lines to `spill_path` if it is set, and dropped otherwise.
+    """
+
+    def __init__(
+        self,
+        diarization: bool = False,
+        max_lines: int = 100,
+        max_line_chars: int = 2000,
+        pending_chunks: int = 20,
+        tail_chars: int = 1000,
+        spill_path: Optional[str] = None,
+    ):
+        """
+        diarization: whether the chunks are split into lines by speaker.
+        max_lines: number of lines kept in memory.
+        max_line_chars: a line longer than this is continued on a new line.
+        pending_chunks: number of recent chunks whose speaker may still change.
+        tail_chars: number of characters kept from the end of the committed text.
+        spill_path: file receiving the lines dropped from memory.
+        """
+        self.diarization = diarization
+        self.max_lines = max_lines
+        self.max_line_chars = max_line_chars
+        self.pending_chunks = pending_chunks
+        self.tail_chars = tail_chars
+        self.spill_path = spill_path
+
+        self.chunks: List[dict] = []
+        self.lines: Deque[dict] = deque([{"speaker": "0", "text": ""}])
+        self.num_spilled_lines = 0
+        self.tail = ""
+        self._spill_file = None
+
+    def append(self, transcription: Transcript):
+        """Add a committed transcript chunk."""
+        if not transcription.text:
+            return
+
+        self.chunks.append(
+            {
+                "beg": transcription.start,
+                "end": transcription.end,
+                "text": transcription.text,
+                "speaker": "0",
+            }
+        )
+        self.tail = (self.tail + transcription.text)[-self.tail_chars:]
+
+        while len(self.chunks) > self.pending_chunks:
+            self._add_chunk(self.lines, self.chunks.pop(0))
+
+        while len(self.lines) > self.max_lines:
+            self._spill(self.lines.popleft())
+
+    def assign_speakers(self, diarization):
+        """Let the diarization update the speakers of the pending chunks."""
+        diarization.assign_speakers_to_chunks(self.chunks)
+
+    def get_lines(self) -> List[dict]:
+        """
+        Returns the lines kept in memory, including the pending chunks.
+        """
+        return self.get_window()[1]
+
+    def get_window(self) -> Tuple[int, List[dict]]:
+        """
+        Returns the lines kept in memory, including the pending chunks, with the
+        index of the first one in the session transcript.
+        """
+        lines = list(self.lines)
+        for chunk in self.chunks:
+            self._add_chunk(lines, chunk)
+        start = max(len(lines) - self.max_lines, 0)
+        return self.num_spilled_lines + start, lines[start:]
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _add_chunk(self, lines, chunk: dict):
+        speaker = chunk["speaker"][-1] if self.diarization and chunk["speaker"] else None
+        if speaker is not None and speaker != lines[-1]["speaker"]:
+            lines.append({"speaker": speaker, "text": chunk["text"]})
+        elif len(lines[-1]["text"]) >= self.max_line_chars:
+            lines.append({"speaker": lines[-1]["speaker"], "text": chunk["text"]})
+        else:
+            lines[-1] = {
+                "speaker": lines[-1]["speaker"],
+                "text": lines[-1]["text"] + chunk["text"],
+            }
+
+    def _spill(self, line: dict):
+        self.num_spilled_lines += 1
+        if self.spill_path is None:
+            return
+        try:
+            if self._spill_file is None:
+                self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+            self._spill_file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            self._spill_file.flush()
+        except OSError as e:
+            logger.warning(f"Could not spill the transcript to {self.spill_path}: {e}")
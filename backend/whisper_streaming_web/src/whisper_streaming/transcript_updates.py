@@ -0,0 +1,122 @@
+import json
+from typing import List, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class TranscriptUpdateEncoder:
+    """
+    Builds the messages sent to a client for the successive states of a transcript.
+
+    Instead of the full {"lines": [...], "buffer": ...} document, the client receives:
+      - {"type": "snapshot", "seq", "offset", "lines", "buffer"}: the lines starting
+        at index `offset` of the session transcript, sent first and then every
+        `snapshot_interval` messages so that the client can resync (only first when
+        `snapshot_interval` is 0).
+      - {"type": "delta", "seq", "n", "lines", "buffer"}: the lines that changed since
+        the previous message, as {"i", "append"} when text was appended to line `i`
+        or {"i", "speaker", "text"} when the line is new or was replaced. `n` is the
+        number of lines of the transcript and "buffer" is only set when it changed.
+
+    With `full_document`, the previous full document format is sent instead.
+    """
+
+    def __init__(self, snapshot_interval: int = 100, full_document: bool = False):
+        self.snapshot_interval = snapshot_interval
+        self.full_document = full_document
+        self.seq = 0
+        self.offset = 0
+        self.lines: List[dict] = []
+        self.buffer: Optional[str] = None
+
+    def update(self, offset: int, lines: List[dict], buffer: str) -> Optional[dict]:
+        """
+        Returns the message for the new transcript state, or None if nothing changed.
+
+        offset: index of the first line in the session transcript.
+        lines: the lines from `offset`.
+        buffer: the tentative text following the last line.
+        """
+        if self.full_document:
+            return {"lines": lines, "buffer": buffer}
+
+        if self.seq == 0 or (
+            self.snapshot_interval > 0 and self.seq % self.snapshot_interval == 0
+        ):
+            message = {
+                "type": "snapshot",
+                "seq": self.seq,
+                "offset": offset,
+                "lines": lines,
+                "buffer": buffer,
+            }
+        else:
+            changes = self._diff(offset, lines)
+            if (
+                not changes
+                and buffer == self.buffer
+                and offset + len(lines) == self.offset + len(self.lines)
+            ):
+                return None
+            message = {
+                "type": "delta",
+                "seq": self.seq,
+                "n": offset + len(lines),
+                "lines": changes,
+            }
+            if buffer != self.buffer:
+                message["buffer"] = buffer
+
+        self.seq += 1
+        self.offset = offset
+        self.lines = lines
+        self.buffer = buffer
+        return message
+
+    def _diff(self, offset: int, lines: List[dict]) -> List[dict]:
+        changes = []
+        for i, line in enumerate(lines):
+            index = offset + i
+            previous_index = index - self.offset
+            previous = (
+                self.lines[previous_index]
+                if 0 <= previous_index < len(self.lines)
+                else None
+            )
+            if previous is line or previous == line:
+                continue
+            if (
+                previous is not None
+                and previous["speaker"] == line["speaker"]
+                and line["text"].startswith(previous["text"])
+            ):
+                changes.append(
+                    {"i": index, "append": line["text"][len(previous["text"]):]}
+                )
+            else:
+                changes.append(
+                    {"i": index, "speaker": line["speaker"], "text": line["text"]}
+                )
+        return changes
+
+
+def serialize_message(message: dict, format: str = "json") -> Union[str, bytes]:
+    """
+    Serializes a message with orjson when it is installed. The "msgpack" format
+    returns bytes, to be sent as a binary WebSocket message.
+    """
+    if format == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("The msgpack format requires the msgpack package")
+        return msgpack.packb(message)
+    if orjson is not None:
+        return orjson.dumps(message).decode("utf-8")
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,69 @@
+import logging
+import os
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_RATE = 16000
+
+# 11 seconds of speech (JFK inaugural address, public domain), 16 kHz mono
+WARMUP_SAMPLE = os.path.join(os.path.dirname(__file__), "samples", "jfk.flac")
+WARMUP_CHUNK_SECONDS = (1.0, 5.0, 10.0)
+
+
+def load_warmup_audio(path: Optional[str] = None) -> np.ndarray:
+    """Loads the warmup audio file, or the bundled speech sample when `path` is None."""
+    import soundfile as sf
+
+    audio, sr = sf.read(path or WARMUP_SAMPLE, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+    if sr != SAMPLING_RATE:
+        # librosa is slow to import, only load it for the files that need resampling
+        import librosa
+
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=SAMPLING_RATE)
+    return audio
+
+
+def warmup_backends(
+    asrs: Iterable,
+    tokenizer=None,
+    path: Optional[str] = None,
+    chunk_seconds=WARMUP_CHUNK_SECONDS,
+) -> float:
+    """
+    Runs representative transcriptions of the warmup audio on each ASR backend and
+    splits a text with the sentence tokenizer, so that their lazy initializations and
+    caches are done before the first session. Returns the warmup duration in seconds.
+
+    A backend that fails to warm up is logged and skipped, as it can still serve sessions.
+    """
+    start = time.monotonic()
+    try:
+        audio = load_warmup_audio(path)
+    except Exception:
+        logger.exception(f"Cannot load the warmup file {path}, using the bundled sample")
+        audio = load_warmup_audio()
+
+    warmed_up = set()
+    for asr in asrs:
+        if asr is None or id(asr) in warmed_up:
+            continue
+        warmed_up.add(id(asr))
+        t = time.monotonic()
+        try:
+            asr.warmup(audio, chunk_seconds)
+        except Exception:
+            logger.exception(f"Warmup of {type(asr).__name__} failed")
+            continue
+        logger.info(f"{type(asr).__name__} warmed up in {time.monotonic() - t:.2f} seconds")
+
+    if tokenizer is not None:
+        tokenizer.split("And so, my fellow Americans. Ask not what your country can do for you.")
+
+    duration = time.monotonic() - start
+    logger.info(f"Warmup done in {duration:.2f} seconds")
+    return duration
@@ -1,10 +1,9 @@
 #!/usr/bin/env python3
 import sys
 import numpy as np
-import librosa
-from functools import lru_cache
 import time
 import logging
+import argparse
 from .backends import FasterWhisperASR, MLXWhisper, WhisperTimestampedASR, OpenaiApiASR
 from .online_asr import OnlineASRProcessor, VACOnlineASRProcessor
 
@@ -83,6 +82,27 @@ def add_shared_args(parser):
         ),
         help="Name size of the Whisper model to use (default: large-v2). The model is automatically downloaded from the model hub if not present in model cache dir.",
     )
+    parser.add_argument(
+        "--draft-model",
+        type=str,
+        default=None,
+        choices="tiny.en,tiny,base.en,base,small.en,small,medium.en,medium,large-v1,large-v2,large-v3,large,large-v3-turbo".split(
+            ","
+        ),
+        help="Small model producing the tentative text between two runs of --model, which then only confirms the text at the --confirm-interval cadence.",
+    )
+    parser.add_argument(
+        "--confirm-interval",
+        type=float,
+        default=1.0,
+        help="With --draft-model, seconds of new audio between two runs of the main model.",
+    )
+    parser.add_argument(
+        "--language-lock-threshold",
+        type=float,
+        default=0.8,
+        help="With --lan auto, probability from which the detected language is kept for the rest of the session instead of being detected again on every iteration.",
+    )
     parser.add_argument(
         "--model_cache_dir",
         type=str,
@@ -131,6 +151,13 @@ def add_shared_args(parser):
         default=False,
         help="Use VAD = voice activity detection, with the default parameters.",
     )
+    parser.add_argument(
+        "--no-batch-alignments",
+        dest="batch_alignments",
+        action="store_false",
+        default=True,
+        help="With faster-whisper, align the word timestamps of each session separately instead of batching the alignments of the concurrent sessions sharing the model.",
+    )
     parser.add_argument(
         "--buffer_trimming",
         type=str,
@@ -184,6 +211,9 @@ def backend_factory(args):
         logger.info("Setting VAD filter")
         asr.use_vad()
 
+    if getattr(args, "batch_alignments", False):
+        asr.use_alignment_batching()
+
     language = args.lan
     if args.task == "translate":
         asr.set_translate_task()
@@ -199,7 +229,17 @@ def backend_factory(args):
         tokenizer = None
     return asr, tokenizer
 
-def online_factory(args, asr, tokenizer, logfile=sys.stderr):
+def draft_backend_factory(args):
+    """Loads the --draft-model backend, or returns None if it is not set."""
+    if getattr(args, "draft_model", None) is None:
+        return None
+    draft_args = argparse.Namespace(**vars(args))
+    draft_args.model = args.draft_model
+    draft_args.model_dir = None
+    draft_asr, _ = backend_factory(draft_args)
+    return draft_asr
+
+def online_factory(args, asr, tokenizer, logfile=sys.stderr, draft_asr=None):
     if args.vac:
         online = VACOnlineASRProcessor(
             args.min_chunk_size,
@@ -207,6 +247,9 @@ def online_factory(args, asr, tokenizer, logfile=sys.stderr):
             tokenizer,
             logfile=logfile,
             buffer_trimming=(args.buffer_trimming, args.buffer_trimming_sec),
+            draft_asr=draft_asr,
+            confirm_interval=getattr(args, "confirm_interval", 1.0),
+            language_lock_threshold=getattr(args, "language_lock_threshold", 0.8),
         )
     else:
         online = OnlineASRProcessor(
@@ -214,6 +257,9 @@ def online_factory(args, asr, tokenizer, logfile=sys.stderr):
             tokenizer,
             logfile=logfile,
             buffer_trimming=(args.buffer_trimming, args.buffer_trimming_sec),
+            draft_asr=draft_asr,
+            confirm_interval=getattr(args, "confirm_interval", 1.0),
+            language_lock_threshold=getattr(args, "language_lock_threshold", 0.8),
         )
     return online
   
@@ -222,7 +268,8 @@ def asr_factory(args, logfile=sys.stderr):
     Creates and configures an ASR and ASR Online instance based on the specified backend and arguments.
     """
     asr, tokenizer = backend_factory(args)
-    online = online_factory(args, asr, tokenizer, logfile=logfile)
+    draft_asr = draft_backend_factory(args)
+    online = online_factory(args, asr, tokenizer, logfile=logfile, draft_asr=draft_asr)
     return asr, online
 
 def set_logging(args, logger, others=[]):
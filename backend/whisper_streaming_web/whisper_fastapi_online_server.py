@@ -1,19 +1,38 @@
+import time
+
+START_TIME = time.perf_counter()
+
 import io
 import argparse
 import asyncio
 import numpy as np
 import ffmpeg
-from time import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.whisper_streaming.whisper_online import backend_factory, online_factory, add_shared_args
+from src.whisper_streaming.whisper_online import backend_factory, draft_backend_factory, online_factory, add_shared_args
+from src.whisper_streaming.transcript_store import TranscriptStore
+from src.whisper_streaming.chunk_scheduler import ChunkScheduler
+from src.whisper_streaming.warmup import warmup_backends
+from src.whisper_streaming.admission import (
+    ACCEPT,
+    OVERLOADED_CLOSE_CODE,
+    REJECT,
+    AdmissionController,
+    add_admission_args,
+)
+from src.whisper_streaming.transcript_updates import TranscriptUpdateEncoder, serialize_message
 
 import subprocess
-import math
+import os
+import uuid
+
+# The ASR backends and torch are imported by the factories that use them, which keeps
+# the startup of the server fast. Run with `python -X importtime` to profile the imports.
+IMPORT_TIME = time.perf_counter() - START_TIME
 
 
 ##### LOAD ARGS #####
@@ -32,7 +51,8 @@ parser.add_argument(
     "--warmup-file",
     type=str,
     dest="warmup_file",
-    help="The path to a speech audio wav file to warm up Whisper so that the very first chunk processing is fast. It can be e.g. https://github.com/ggerganov/whisper.cpp/raw/master/samples/jfk.wav .",
+    default=None,
+    help="The path to a speech audio file to warm up Whisper so that the very first chunk processing is fast, e.g. https://github.com/ggerganov/whisper.cpp/raw/master/samples/jfk.wav once downloaded. By default, a bundled speech sample is used.",
 )
 
 parser.add_argument(
@@ -41,16 +61,59 @@ parser.add_argument(
     default=False,
     help="Whether to enable speaker diarization.",
 )
+parser.add_argument(
+    "--transcript-max-lines",
+    type=int,
+    default=100,
+    help="Number of transcript lines kept in memory and sent to the client per session.",
+)
+parser.add_argument(
+    "--transcript-spill-dir",
+    type=str,
+    default=None,
+    help="Directory where the transcript lines dropped from memory are written, one file per session.",
+)
+parser.add_argument(
+    "--full-updates",
+    action="store_true",
+    default=False,
+    help="Send the full {lines, buffer} document on every update instead of sequence-numbered deltas (previous protocol).",
+)
+parser.add_argument(
+    "--snapshot-interval",
+    type=int,
+    default=100,
+    help="Number of updates between two full transcript snapshots in the delta protocol. With 0, only the first update is a snapshot.",
+)
+parser.add_argument(
+    "--ws-serialization",
+    type=str,
+    default="json",
+    choices=["json", "msgpack"],
+    help="Serialization of the WebSocket messages. msgpack messages are sent as binary frames.",
+)
+parser.add_argument(
+    "--target-lag",
+    type=float,
+    default=None,
+    help="Target delay in seconds between the arrival of audio and its transcription. The processing interval is adapted to the measured processing time to hold it. By default, the audio is processed every --min-chunk-size seconds.",
+)
 
 
 add_shared_args(parser)
+add_admission_args(parser)
 args = parser.parse_args()
 
+# Configuration of the sessions admitted past capacity
+degraded_args = argparse.Namespace(**vars(args))
+degraded_args.model = args.degraded_model or args.model
+degraded_args.min_chunk_size = args.degraded_min_chunk_size or args.min_chunk_size
+
 SAMPLE_RATE = 16000
 CHANNELS = 1
-SAMPLES_PER_SEC = SAMPLE_RATE * int(args.min_chunk_size)
 BYTES_PER_SAMPLE = 2  # s16le = 2 bytes per sample
-BYTES_PER_SEC = SAMPLES_PER_SEC * BYTES_PER_SAMPLE
+BYTES_PER_SEC = SAMPLE_RATE * BYTES_PER_SAMPLE
+READ_SIZE = 65536  # Upper bound of a read, which returns whatever ffmpeg decoded so far
 
 if args.diarization:
     from src.diarization.diarization_online import DiartDiarization
@@ -58,11 +121,40 @@ if args.diarization:
 
 ##### LOAD APP #####
 
+warmup_seconds = None  # Set when the warmup is done
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global asr, tokenizer
+    global asr, tokenizer, degraded_asr, draft_asr
+    t = time.perf_counter()
     asr, tokenizer = backend_factory(args)
+    draft_asr = draft_backend_factory(args)
+    degraded_asr = backend_factory(degraded_args)[0] if args.degraded_model else asr
+    print(
+        f"Server modules imported in {IMPORT_TIME:.2f} seconds, "
+        f"ASR models loaded in {time.perf_counter() - t:.2f} seconds."
+    )
+
+    # Sessions are served during the warmup, /ready reports when it is done
+    warmup_task = asyncio.create_task(warmup())
     yield
+    warmup_task.cancel()
+    for backend in {asr, draft_asr, degraded_asr} - {None}:
+        backend.close()
+
+async def warmup():
+    global warmup_seconds
+    start = time.perf_counter()
+    try:
+        warmup_seconds = await asyncio.to_thread(
+            warmup_backends, [asr, draft_asr, degraded_asr], tokenizer, args.warmup_file
+        )
+        print(f"ASR warmed up in {warmup_seconds:.2f} seconds.")
+    except Exception as e:
+        # The models are loaded and serve the sessions, only the first iterations
+        # are slower, so the server is still reported ready.
+        warmup_seconds = time.perf_counter() - start
+        print(f"ASR warmup failed after {warmup_seconds:.2f} seconds: {type(e).__name__}: {e}")
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(
@@ -74,6 +166,8 @@ app.add_middleware(
 )
 
 
+admission = AdmissionController.from_args(args)
+
 # Load demo HTML for the root endpoint
 with open("src/web/live_transcription.html", "r", encoding="utf-8") as f:
     html = f.read()
@@ -103,98 +197,125 @@ async def start_ffmpeg_decoder():
 async def get():
     return HTMLResponse(html)
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe, which fails until the ASR backends are warmed up."""
+    if warmup_seconds is None:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"ready": True, "warmup_seconds": warmup_seconds}
+
+@app.get("/metrics")
+async def metrics():
+    """Admission counters, server load and per-session transcription lag."""
+    return admission.stats()
+
 @app.websocket("/asr")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     print("WebSocket connection opened.")
 
-    ffmpeg_process = await start_ffmpeg_decoder()
-    pcm_buffer = bytearray()
+    decision = admission.admit()
+    if decision == REJECT:
+        await websocket.close(code=OVERLOADED_CLOSE_CODE, reason="Server overloaded, try again later.")
+        return
+    session_args = args if decision == ACCEPT else degraded_args
+    scheduler = ChunkScheduler(session_args.min_chunk_size, target_lag=args.target_lag)
+
     print("Loading online.")
-    online = online_factory(args, asr, tokenizer)
+    online = online_factory(
+        session_args, asr if decision == ACCEPT else degraded_asr, tokenizer, draft_asr=draft_asr
+    )
     print("Online loaded.")
 
+    ffmpeg_process = await start_ffmpeg_decoder()
+    pcm_buffer = bytearray()
+
     if args.diarization:
         diarization = DiartDiarization(SAMPLE_RATE)
 
+    transcript = TranscriptStore(
+        diarization=args.diarization,
+        max_lines=args.transcript_max_lines,
+        spill_path=(
+            os.path.join(args.transcript_spill_dir, f"{uuid.uuid4().hex}.jsonl")
+            if args.transcript_spill_dir
+            else None
+        ),
+    )
+    updates = TranscriptUpdateEncoder(
+        snapshot_interval=args.snapshot_interval, full_document=args.full_updates
+    )
+
+    processing = None
+
+    # Process all the audio received so far, while the reader keeps reading
+    async def process_audio(pcm_array):
+        loop = asyncio.get_event_loop()
+        try:
+            online.insert_audio_chunk(pcm_array)
+            transcription = await loop.run_in_executor(None, online.process_iter)
+
+            transcript.append(transcription)
+            buffer = online.get_buffer()
+
+            if buffer in transcript.tail: # With VAC, the buffer is not updated until the next chunk is processed
+                buffer = ""
+
+            if args.diarization:
+                await diarization.diarize(pcm_array)
+                transcript.assign_speakers(diarization)
+
+            offset, lines = transcript.get_window()
+            response = updates.update(offset, lines, buffer)
+            if response is not None:
+                data = serialize_message(response, args.ws_serialization)
+                if isinstance(data, bytes):
+                    await websocket.send_bytes(data)
+                else:
+                    await websocket.send_text(data)
+        except Exception as e:
+            print(f"Exception in process_audio: {e}")
+        finally:
+            scheduler.done()
+
     # Continuously read decoded PCM from ffmpeg stdout in a background task
     async def ffmpeg_stdout_reader():
-        nonlocal pcm_buffer
+        nonlocal pcm_buffer, processing
         loop = asyncio.get_event_loop()
-        full_transcription = ""
-        beg = time()
-        
-        chunk_history = []  # Will store dicts: {beg, end, text, speaker}
-        
+
         while True:
             try:
-                elapsed_time = math.floor((time() - beg) * 10) / 10 # Round to 0.1 sec
-                ffmpeg_buffer_from_duration = max(int(32000 * elapsed_time), 4096)
-                beg = time()
                 chunk = await loop.run_in_executor(
-                    None, ffmpeg_process.stdout.read, ffmpeg_buffer_from_duration
+                    None, ffmpeg_process.stdout.read1, READ_SIZE
                 )
                 if not chunk:
                     print("FFmpeg stdout closed.")
                     break
 
                 pcm_buffer.extend(chunk)
-                if len(pcm_buffer) >= BYTES_PER_SEC:
+                scheduler.add_audio(len(chunk) / BYTES_PER_SEC)
+                if scheduler.ready():
                     # Convert int16 -> float32
                     pcm_array = (
                         np.frombuffer(pcm_buffer, dtype=np.int16).astype(np.float32)
                         / 32768.0
                     )
                     pcm_buffer = bytearray()
-                    online.insert_audio_chunk(pcm_array)
-                    transcription = online.process_iter()
-                    
-                    if transcription:
-                        chunk_history.append({
-                        "beg": transcription.start,
-                        "end": transcription.end,
-                        "text": transcription.text,
-                        "speaker": "0"
-                        })
-                    
-                    full_transcription += transcription.text
-                    buffer = online.get_buffer()
-                  
-                    if buffer in full_transcription: # With VAC, the buffer is not updated until the next chunk is processed
-                        buffer = ""
-                                        
-                    lines = [
-                        {
-                            "speaker": "0",
-                            "text": "",
-                        }
-                    ]
-                    
-                    if args.diarization:
-                        await diarization.diarize(pcm_array)
-                        diarization.assign_speakers_to_chunks(chunk_history)
-
-                    for ch in chunk_history:
-                        if args.diarization and ch["speaker"] and ch["speaker"][-1] != lines[-1]["speaker"]:
-                            lines.append(
-                                {
-                                    "speaker": ch["speaker"][-1],
-                                    "text": ch['text']
-                                }
-                            )
-                        else:
-                            lines[-1]["text"] += ch['text']
-
-                    response = {"lines": lines, "buffer": buffer}
-                    await websocket.send_json(response)
-                    
+                    scheduler.start()
+                    processing = asyncio.create_task(process_audio(pcm_array))
+
             except Exception as e:
                 print(f"Exception in ffmpeg_stdout_reader: {e}")
                 break
 
+        if processing is not None:
+            await processing
         print("Exiting ffmpeg_stdout_reader...")
 
     stdout_reader_task = asyncio.create_task(ffmpeg_stdout_reader())
+    # Only a session whose setup succeeded takes an admission slot, which the
+    # finally block below releases
+    admission.add(scheduler, online.language_stats)
 
     try:
         while True:
@@ -215,6 +336,9 @@ async def websocket_endpoint(websocket: WebSocket):
         except:
             pass
         stdout_reader_task.cancel()
+        # Stop processing before the transcript is closed below
+        if processing is not None:
+            processing.cancel()
 
         try:
             ffmpeg_process.stdout.close()
@@ -222,6 +346,8 @@ async def websocket_endpoint(websocket: WebSocket):
             pass
 
         ffmpeg_process.wait()
+        transcript.close()
+        admission.remove(scheduler)
         del online
         
         if args.diarization: